@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+""" Times drawing a crowded screen's sprites with the clears blitted one by one against clearing each
+    group in a single Surface.blits, the way RenderUpdatesDraw.clear does.
+
+    Puts the given number of opponents (60 by default), plus a few powerups, in view of a PlatformingScene
+    and draws the same frame over and over both ways, dirty tracking and all. The best of 10 rounds is reported:
+
+    python blitbench.py [sprites] [frames]
+"""
+
+import os, sys, time
+import pygame
+
+def main(argv = sys.argv):
+    sprites = int(argv[1]) if len(argv) > 1 else 60
+    frames = int(argv[2]) if len(argv) > 2 else 100
+    rounds = 10
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+    screen = pygame.display.set_mode((800, 600))
+
+    import random
+    from general import WordMaker, game_constants
+    from opponents import Soldier, Copter, Ghost
+    from powerup import Heart, Shotgun
+    from scene import PlatformingScene
+
+    random.seed(1)
+    game_constants.w, game_constants.h = screen.get_size()
+    scene = PlatformingScene(screen)
+    words = WordMaker(['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet'])
+    for i in xrange(sprites):
+        EnemyType = (Soldier, Copter, Ghost)[i % 3]
+        position = (60 + (i * 97) % 680, 60 + (i * 53) % 440)
+        scene.actives.add(EnemyType(words.next_word(), position, scene.statics))
+    for i in xrange(sprites / 10):
+        scene.powerups.add((Heart, Shotgun)[i % 2]((100 + i * 60, 300)))
+
+    groups = [scene.screenstatics, scene.powerups, scene.actives, scene.playergroup]
+    screen.set_clip(0, scene.headersize, game_constants.w, game_constants.h)
+
+    def direct():
+        # How frames were cleared before: every sprite's old spot blitted on its own
+        for group in groups:
+            pygame.sprite.RenderClear.clear(group, screen, scene.layer.surface)
+        for group in groups:
+            group.draw(screen, scene.camera)
+
+    def batched():
+        for group in groups:
+            group.clear(screen, scene.layer.surface)
+        for group in groups:
+            group.draw(screen, scene.camera)
+
+    batched()
+    clears = sum(len([rect for rect in group.spritedict.values() if rect]) for group in groups) # Per frame
+
+    # Interleaved and best of several, the machine's noise is bigger than the difference
+    best = {direct : None, batched : None}
+    for _ in xrange(rounds):
+        for draw in (direct, batched):
+            start = time.time()
+            for _ in xrange(frames):
+                draw()
+            elapsed = (time.time() - start) * 1000 / frames
+            best[draw] = min(best[draw], elapsed) if best[draw] is not None else elapsed
+
+    print '%d sprites, %d clears a frame' % (len(scene.actives) + len(scene.powerups) + len(scene.screenstatics) + 1, clears)
+    print 'one at a time:   %.2fms a frame' % best[direct]
+    print 'Surface.blits:   %.2fms a frame' % best[batched]
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,376 @@
-import pygame
-from general import game_constants
+import pygame, math, bisect
+from general import game_constants, RenderUpdatesDraw
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # Batch queries fall back to one distfromground() per rect
+
+class SpatialHash:
+    """ Uniform grid of world-space cells, each holding the sprites whose rect touches it.
+        Sprites are assumed not to move while they are in the hash (platforms don't).
+    """
+
+    def __init__(self, cell_size = 128):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+        self.max_row = None
+
+    def _span(self, low, high):
+        # Cells covering the pixels [low, high), or the single pixel at low if the span is empty
+        return low // self.cell_size, max(low, high - 1) // self.cell_size
+
+    def add(self, sprite):
+        rect = sprite.rect
+        left_col, right_col = self._span(rect.left, rect.right)
+        top_row, bottom_row = self._span(rect.top, rect.bottom)
+
+        keys = [(col, row) for col in xrange(left_col, right_col + 1) for row in xrange(top_row, bottom_row + 1)]
+        for key in keys:
+            self.cells.setdefault(key, []).append(sprite)
+        self.sprite_cells[sprite] = keys
+
+        if self.max_row is None or bottom_row > self.max_row:
+            self.max_row = bottom_row
+
+    def remove(self, sprite):
+        for key in self.sprite_cells.pop(sprite, ()):
+            cell = self.cells[key]
+            cell.remove(sprite)
+            if not cell:
+                del self.cells[key]
+
+    def _row(self, row, cols):
+        """ All sprites in one row of cells, over a range of columns. May contain duplicates. """
+        found = []
+        for col in cols:
+            cell = self.cells.get((col, row))
+            if cell:
+                found.extend(cell)
+        return found
+
+    def query(self, rect):
+        """ Set of sprites whose rect collides with 'rect' """
+        left_col, right_col = self._span(rect.left, rect.right)
+        top_row, bottom_row = self._span(rect.top, rect.bottom)
+        cols = xrange(left_col, right_col + 1)
+
+        found = set()
+        for row in xrange(top_row, bottom_row + 1):
+            for sprite in self._row(row, cols):
+                if sprite.rect.colliderect(rect):
+                    found.add(sprite)
+        return found
+
+    def below(self, rect):
+        """ Set of sprites in the columns under 'rect', from its bottom edge down """
+        if self.max_row is None:
+            return set()
+        depth = (self.max_row + 1) * self.cell_size - rect.bottom
+        if depth <= 0:
+            return set()
+        # A zero-width rect still has ground under it, and collides with nothing
+        return self.query(pygame.rect.Rect(rect.left, rect.bottom, max(rect.width, 1), depth))
+
+    def distfromground(self, rect):
+        """ Same answer as distfromground() over every sprite in the hash, scanning rows downward
+            from the rect's bottom and stopping once no lower row could hold anything closer.
+        """
+        smallest = game_constants.big_distance
+        if self.max_row is None:
+            return smallest
+
+        leftx, rightx, bottom = rect.left, rect.right, rect.bottom
+        left_col, right_col = self._span(leftx, rightx)
+        cols = xrange(left_col, right_col + 1)
+
+        for row in xrange(bottom // self.cell_size, self.max_row + 1):
+            for sprite in self._row(row, cols):
+                srect = sprite.rect
+                if srect.left < rightx and leftx < srect.right and bottom <= srect.top:
+                    dist = srect.top - bottom
+                    if dist < smallest:
+                        smallest = dist
+            # Anything not seen yet has its top in a lower row
+            if smallest <= (row + 1) * self.cell_size - bottom:
+                break
+        return smallest
+
+    def distfromceiling(self, rect):
+        """ Same answer as distfromceiling() over every sprite in the hash """
+        smallest = game_constants.big_distance
+        if self.max_row is None:
+            return smallest
+
+        leftx, rightx, top = rect.left, rect.right, rect.top
+        left_col, right_col = self._span(leftx, rightx)
+        cols = xrange(left_col, right_col + 1)
+
+        for row in xrange((top - 1) // self.cell_size, self.max_row + 1):
+            for sprite in self._row(row, cols):
+                srect = sprite.rect
+                if srect.left < rightx and leftx < srect.right and top <= srect.bottom:
+                    dist = srect.bottom - top
+                    if dist < smallest:
+                        smallest = dist
+            # Anything not seen yet has its bottom edge below this row
+            if smallest <= (row + 1) * self.cell_size + 1 - top:
+                break
+        return smallest
+
+class IndexedGroup(RenderUpdatesDraw):
+    """ A RenderUpdatesDraw that keeps a SpatialHash of its members in sync as they're added and removed """
+
+    def __init__(self, *sprites):
+        self.index = SpatialHash()
+        self.sightlines = SightLines(self)
+        self._packed = None
+        super(IndexedGroup, self).__init__(*sprites)
+
+    def add_internal(self, sprite):
+        super(IndexedGroup, self).add_internal(sprite)
+        self.index.add(sprite)
+        self._packed = None
+
+    def remove_internal(self, sprite):
+        super(IndexedGroup, self).remove_internal(sprite)
+        self.index.remove(sprite)
+        self._packed = None
+
+    def packed(self):
+        """ packrects() of the members, rebuilt only after the membership changes """
+        if self._packed is None:
+            self._packed = packrects(self)
+        return self._packed
+
+class PointIndex:
+    """ Uniform grid over sprites' (x, y) positions, for radius and nearest-neighbour queries.
+        Meant for things that move every tick, so it is rebuilt wholesale rather than updated.
+    """
+
+    def __init__(self, cell_size = 64):
+        self.cell_size = cell_size
+        self.rebuild([])
+
+    def cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def rebuild(self, sprites):
+        self.cells = {}
+        for sprite in sprites:
+            self.cells.setdefault(self.cell(sprite.x, sprite.y), []).append(sprite)
+
+        if self.cells:
+            cols = [col for col, row in self.cells]
+            rows = [row for col, row in self.cells]
+            self.bounds = (min(cols), min(rows), max(cols), max(rows))
+        else:
+            self.bounds = None
+
+    def radius(self, x, y, radius):
+        """ Every sprite within 'radius' of (x, y) """
+        left, top = self.cell(x - radius, y - radius)
+        right, bottom = self.cell(x + radius, y + radius)
+        limit = radius * radius
+
+        found = []
+        for col in xrange(left, right + 1):
+            for row in xrange(top, bottom + 1):
+                for sprite in self.cells.get((col, row), ()):
+                    if (sprite.x - x) ** 2 + (sprite.y - y) ** 2 <= limit:
+                        found.append(sprite)
+        return found
+
+    def nearest(self, x, y, k = 1):
+        """ Up to k sprites closest to (x, y), nearest first """
+        if self.bounds is None:
+            return []
+
+        def dist(sprite):
+            return math.hypot(sprite.x - x, sprite.y - y)
+
+        col, row = self.cell(x, y)
+        min_col, min_row, max_col, max_row = self.bounds
+        last_ring = max(col - min_col, max_col - col, row - min_row, max_row - row)
+
+        found = []
+        for ring in xrange(0, last_ring + 1):
+            for key in self._ring(col, row, ring):
+                found.extend(self.cells.get(key, ()))
+            # Every sprite within ring * cell_size of the point has been seen by now
+            if len(found) >= k:
+                found.sort(key = dist)
+                if dist(found[k - 1]) <= ring * self.cell_size:
+                    break
+        found.sort(key = dist)
+        return found[:k]
+
+    def _ring(self, col, row, ring):
+        """ Cells exactly 'ring' steps (in either axis) from (col, row) """
+        if ring == 0:
+            return [(col, row)]
+        keys = []
+        for c in xrange(col - ring, col + ring + 1):
+            keys += [(c, row - ring), (c, row + ring)]
+        for r in xrange(row - ring + 1, row + ring):
+            keys += [(col - ring, r), (col + ring, r)]
+        return keys
+
+    def chain(self, sprites, radius, accept = lambda sprite: True):
+        """ Everything reachable from 'sprites' by hops of at most 'radius' between accepted sprites """
+        reached = set(sprites)
+        frontier = list(sprites)
+        while frontier:
+            sprite = frontier.pop()
+            for other in self.radius(sprite.x, sprite.y, radius):
+                if other not in reached and accept(other):
+                    reached.add(other)
+                    frontier.append(other)
+        return reached
+
+class SweepAndPrune:
+    """ Persistent broadphase over several tagged sprite groups.
+        Entries stay sorted by the left edge of their rect between frames, so the
+        insertion sort in update() only has to fix up whatever moved past a neighbour.
+    """
+
+    # Spans wider than this (the level's floor) are kept aside for query() to check on their own,
+    # so that one long one doesn't make every query walk back to the start
+    wide_span = 1024
+
+    def __init__(self, groups, interesting):
+        self.groups = groups           # tag -> sprite group
+        self.interesting = interesting # (tag, tag) pairs worth reporting
+        self.entries = []              # [left, right, sprite, tag], sorted by left
+        self.candidates = {}
+        self.lefts = []                # Left edge of each entry, to bisect
+        self.reach = 0                 # Widest span that isn't a wide one
+        self.wide = []                 # Entries wider than wide_span
+
+    def sync(self):
+        """ Follow sprites into and out of the tracked groups """
+        current = {}
+        for tag, group in self.groups.items():
+            for sprite in group:
+                current[sprite] = tag
+
+        entries = []
+        for entry in self.entries:
+            if current.get(entry[2]) == entry[3]:
+                entries.append(entry)
+                del current[entry[2]]
+        for sprite, tag in current.items():
+            entries.append([sprite.rect.left, sprite.rect.right, sprite, tag])
+        self.entries = entries
+
+    def update(self):
+        self.sync()
+
+        entries = self.entries
+        for entry in entries:
+            entry[0], entry[1] = entry[2].rect.left, entry[2].rect.right
+
+        for i in xrange(1, len(entries)):
+            entry = entries[i]
+            j = i - 1
+            while j >= 0 and entries[j][0] > entry[0]:
+                entries[j + 1] = entries[j]
+                j -= 1
+            entries[j + 1] = entry
+
+        # Sweep along x, keeping the entries whose span hasn't ended yet
+        self.candidates = dict((pair, []) for pair in self.interesting)
+        open_entries = []
+        self.lefts, self.reach, self.wide = lefts, reach, wide = [], 0, []
+        for entry in entries:
+            left, right, sprite, tag = entry
+            lefts.append(left)
+            if right - left > self.wide_span:
+                wide.append(entry)
+            elif right - left > reach:
+                reach = right - left
+            open_entries = [other for other in open_entries if other[1] > left]
+            for other in open_entries:
+                if (tag, other[3]) in self.candidates:
+                    first, second = sprite, other[2]
+                    pair = (tag, other[3])
+                elif (other[3], tag) in self.candidates:
+                    first, second = other[2], sprite
+                    pair = (other[3], tag)
+                else:
+                    continue
+                if first.rect.colliderect(second.rect):
+                    self.candidates[pair].append((first, second))
+            open_entries.append(entry)
+        self.reach = reach
+
+    def pairs(self, tag_a, tag_b):
+        """ (sprite from tag_a, sprite from tag_b) for every overlap found by the last update() """
+        return self.candidates[(tag_a, tag_b)]
+
+    def query(self, rect, tag):
+        """ Members of 'tag' whose rect collides with 'rect', as of the last update() """
+        # Only wide entries can reach the rect from further left than 'reach'
+        edge = rect.left - self.reach
+        found = [sprite for left, right, sprite, entry_tag in self.wide
+                 if entry_tag == tag and left <= edge and right > rect.left and sprite.rect.colliderect(rect)]
+
+        entries = self.entries
+        for i in xrange(bisect.bisect_right(self.lefts, edge), bisect.bisect_left(self.lefts, rect.right)):
+            left, right, sprite, entry_tag = entries[i]
+            if entry_tag == tag and right > rect.left and sprite.rect.colliderect(rect):
+                found.append(sprite)
+        return found
+
+def masks_collide(a, b):
+    """ Narrowphase for two sprites whose rects already overlap: do their opaque pixels touch?
+        A sprite without a mask counts as a solid rect.
+    """
+    amask = getattr(a, 'collision_mask', lambda: None)()
+    bmask = getattr(b, 'collision_mask', lambda: None)()
+    if amask is None or bmask is None:
+        return True
+    (amask, (ax, ay)), (bmask, (bx, by)) = amask, bmask
+    return amask.overlap(bmask, (bx - ax, by - ay)) is not None
+
+def packrects(sprites):
+    """ N x 4 array of (left, top, right, bottom) for each sprite's rect """
+    packed = numpy.array([(s.rect.left, s.rect.top, s.rect.right, s.rect.bottom) for s in sprites], dtype = numpy.int64)
+    return packed.reshape((-1, 4))
+
+def distsfromground(rects, colliders):
+    """ What distfromground() would give for each of many rects at once, as a list in the same order.
+        From an IndexedGroup only the statics under the rects' combined span get packed, so the cost
+        doesn't grow with the world (actives are all around the player anyway).
+    """
+    if numpy is None:
+        return [distfromground(rect, colliders) for rect in rects]
+
+    big = game_constants.big_distance
+    if not rects:
+        return []
+
+    if isinstance(colliders, IndexedGroup):
+        span = rects[0].unionall(rects[1:])
+        statics = packrects(colliders.index.below(pygame.rect.Rect(span.left, min(r.bottom for r in rects), span.width, 0)))
+    else:
+        statics = packrects(colliders)
+    if not len(statics):
+        return [big] * len(rects)
+
+    bodies = numpy.array([(r.left, r.right, r.bottom) for r in rects], dtype = numpy.int64)
+    left, right, bottom = [bodies[:, i:i + 1] for i in xrange(3)] # columns, to broadcast against statics
+    s_left, s_top, s_right = statics[:, 0], statics[:, 1], statics[:, 2]
+
+    overlap = (s_left < right) & (left < s_right)
+    return numpy.where(overlap & (bottom <= s_top), s_top - bottom, big).min(axis = 1).tolist()
 
 def distfromground(rect, colliders):
     """ Evaluates distance from all screen sprites based on floating point position """
+    if isinstance(colliders, IndexedGroup):
+        return colliders.index.distfromground(rect)
+
     smallest = game_constants.big_distance
     leftx = rect.left
     rightx = rect.right
@@ -18,6 +386,9 @@ def distfromground(rect, colliders):
     
 def distfromceiling(rect, colliders):
     """ Evaluates distance from all screen sprites based on floating point position """
+    if isinstance(colliders, IndexedGroup):
+        return colliders.index.distfromceiling(rect)
+
     smallest = game_constants.big_distance
     leftx = rect.left
     rightx = rect.right
@@ -51,20 +422,236 @@ def twopointrect((startx, starty), (destx, desty)):
     height = bottomright[1] - topleft[1]
     return pygame.rect.Rect((topleft), (width, height))
     
-def clearshot((startx, starty), (destx, desty), rectlist, depth = 3):
-    """ True if there is a clear path from 'rect' to 'dest' """
-    # Get all colliders contained within these two points
-    indices = twopointrect((startx, starty), (destx, desty)).collidelistall(rectlist)
-    rects = [rectlist[idx] for idx in indices]
-    
-    if len(rects) == 0: return True
-    elif depth == 0: return False # Drilled as far down as i'm willing
-    
-    xdist = destx - startx
-    ydist = desty - starty
-    midpoint = (startx + xdist / 2, starty + ydist / 2)
-    
-    # Divide the RECTANGLE OF POSSIBILITY into two. Only pass on the rects that collided with the current one.
-    r1 = clearshot((startx, starty), midpoint, rects, depth - 1)
-    r2 = clearshot(midpoint, (destx, desty), rects, depth - 1)
-    return (r1 and r2)
+class ContactCache:
+    """ Remembers what a body was last found standing on, and what its top was last found pressed against.
+        While the body is still touching that same static, a ground or ceiling query is answered (with 0,
+        which no search could beat) without searching. Anything else falls through to a full query.
+    """
+
+    # Totals over every cache, to see how many full queries are being saved
+    hits = 0
+    misses = 0
+
+    def __init__(self):
+        self.support = None
+        self.overhead = None
+
+    def cached_ground(self, rect, colliders):
+        """ 0 if 'rect' is still standing on the remembered support, or None if a full query is needed """
+        if self.support is not None and self.support in colliders and _resting_on(rect, self.support.rect):
+            ContactCache.hits += 1
+            return 0
+        ContactCache.misses += 1
+        return None
+
+    def found_ground(self, rect, colliders, dist):
+        """ Remember the outcome of a full ground query for 'rect' """
+        self.support = None
+        if dist == 0:
+            for sprite in _touching(rect, colliders, pygame.rect.Rect(rect.left, rect.bottom, max(rect.width, 1), 1)):
+                if _resting_on(rect, sprite.rect):
+                    self.support = sprite
+                    break
+
+    def ground(self, rect, colliders):
+        dist = self.cached_ground(rect, colliders)
+        if dist is None:
+            dist = distfromground(rect, colliders)
+            self.found_ground(rect, colliders, dist)
+        return dist
+
+    def ceiling(self, rect, colliders):
+        if self.overhead is not None and self.overhead in colliders and _pressed_under(rect, self.overhead.rect):
+            ContactCache.hits += 1
+            return 0
+        ContactCache.misses += 1
+
+        dist = distfromceiling(rect, colliders)
+        self.overhead = None
+        if dist == 0:
+            for sprite in _touching(rect, colliders, pygame.rect.Rect(rect.left, rect.top - 1, max(rect.width, 1), 1)):
+                if _pressed_under(rect, sprite.rect):
+                    self.overhead = sprite
+                    break
+        return dist
+
+def _resting_on(rect, other):
+    """ distfromground() of 'rect' against 'other' is 0 """
+    return other.top == rect.bottom and other.left < rect.right and rect.left < other.right
+
+def _pressed_under(rect, other):
+    """ distfromceiling() of 'rect' against 'other' is 0 """
+    return other.bottom == rect.top and other.left < rect.right and rect.left < other.right
+
+def _touching(rect, colliders, strip):
+    if isinstance(colliders, IndexedGroup):
+        return colliders.index.query(strip)
+    return colliders
+
+def groundbelow(rect, colliders):
+    """ Where 'rect' would come to rest if dropped straight down: the bottom it would end up with,
+        or None if there's nothing underneath to land on.
+    """
+    dist = distfromground(rect, colliders)
+    if dist == game_constants.big_distance:
+        return None
+    return rect.bottom + dist
+
+def overlapping(rect, colliders):
+    """ The sprites in 'colliders' whose rect collides with 'rect' """
+    if isinstance(colliders, IndexedGroup):
+        return colliders.index.query(rect)
+    return [sprite for sprite in colliders if sprite.rect.colliderect(rect)]
+
+def freeabove(rect, colliders):
+    """ The bottom of the lowest spot, at or above 'rect', where it overlaps nothing in 'colliders' """
+    rect = rect.copy()
+    while True:
+        inside = overlapping(rect, colliders)
+        if not inside:
+            return rect.bottom
+        rect.bottom = min([sprite.rect.top for sprite in inside]) # Hop on top of whatever's in the way
+
+def sweptrect(rect, (dx, dy)):
+    """ Rect covering everything 'rect' passes over while moving by (dx, dy) """
+    left = math.floor(min(rect.left, rect.left + dx))
+    top = math.floor(min(rect.top, rect.top + dy))
+    right = math.ceil(max(rect.right, rect.right + dx))
+    bottom = math.ceil(max(rect.bottom, rect.bottom + dy))
+    return pygame.rect.Rect(int(left), int(top), int(right - left), int(bottom - top))
+
+def _axis_times(low, high, other_low, other_high, delta):
+    """ When a span moving by 'delta' starts and stops overlapping another span, as fractions of the move """
+    if delta == 0:
+        if low < other_high and other_low < high:
+            return float('-inf'), float('inf')
+        return None, None
+    if delta > 0:
+        return (other_low - high) / float(delta), (other_high - low) / float(delta)
+    return (other_high - low) / float(delta), (other_low - high) / float(delta)
+
+def sweep(rect, (dx, dy), colliders):
+    """ Move 'rect' by (dx, dy) through 'colliders' and return (time of impact, contact normal, sprite hit).
+        Time of impact is the fraction of the move that can be made before touching something,
+        and the normal points out of the side that was hit. A clear path gives (1.0, None, None).
+        Anything 'rect' already overlaps is ignored, so it can always move back out again.
+    """
+    if isinstance(colliders, IndexedGroup):
+        colliders = colliders.index.query(sweptrect(rect, (dx, dy)))
+
+    toi, normal, hit = 1.0, None, None
+    for sprite in colliders:
+        other = sprite.rect
+        if other.colliderect(rect):
+            continue
+        entry_x, exit_x = _axis_times(rect.left, rect.right, other.left, other.right, dx)
+        if entry_x is None:
+            continue
+        entry_y, exit_y = _axis_times(rect.top, rect.bottom, other.top, other.bottom, dy)
+        if entry_y is None:
+            continue
+
+        entry = max(entry_x, entry_y)
+        if 0 <= entry < toi and entry < min(exit_x, exit_y):
+            toi, hit = entry, sprite
+            if entry_x >= entry_y: # The x slab was the last one entered: hit a wall
+                normal = (-1 if dx > 0 else 1, 0)
+            else:
+                normal = (0, -1 if dy > 0 else 1)
+    return toi, normal, hit
+
+def segment_hits_rect((startx, starty), (destx, desty), rect):
+    """ Exact slab test: does the segment between the two points pass through the inside of 'rect' """
+    tmin, tmax = 0.0, 1.0
+    for start, delta, low, high in ((startx, destx - startx, rect.left, rect.right),
+                                    (starty, desty - starty, rect.top, rect.bottom)):
+        if delta == 0:
+            # Parallel to this slab: either always inside it or never
+            if not low <= start < high:
+                return False
+        else:
+            t1 = (low - start) / float(delta)
+            t2 = (high - start) / float(delta)
+            if t1 > t2:
+                t1, t2 = t2, t1
+            tmin, tmax = max(tmin, t1), min(tmax, t2)
+            if tmin >= tmax:
+                return False
+    return True
+
+def segment_hits_packed((startx, starty), (destx, desty), packed):
+    """ segment_hits_rect() against every row of a packrects() array at once. True if any is hit. """
+    if not len(packed):
+        return False
+
+    # Throw out everything outside the segment's bounding box before doing any division
+    packed = packed[(packed[:, 0] <= max(startx, destx)) & (min(startx, destx) < packed[:, 2]) &
+                    (packed[:, 1] <= max(starty, desty)) & (min(starty, desty) < packed[:, 3])]
+    if not len(packed):
+        return False
+
+    tmin = numpy.zeros(len(packed))
+    tmax = numpy.ones(len(packed))
+    inside = numpy.ones(len(packed), dtype = bool)
+    for start, delta, low, high in ((startx, destx - startx, packed[:, 0], packed[:, 2]),
+                                    (starty, desty - starty, packed[:, 1], packed[:, 3])):
+        if delta == 0:
+            inside &= (low <= start) & (start < high)
+        else:
+            t1 = (low - start) / float(delta)
+            t2 = (high - start) / float(delta)
+            tmin = numpy.maximum(tmin, numpy.minimum(t1, t2))
+            tmax = numpy.minimum(tmax, numpy.maximum(t1, t2))
+    return bool((inside & (tmin < tmax)).any())
+
+class SightLines:
+    """ Line-of-sight queries against an IndexedGroup.
+        Answers are memoized per (source cell, target cell) and thrown away by new_frame(),
+        so every opponent asking about the same pair of cells in one frame shares one test.
+    """
+
+    def __init__(self, statics, cell_size = 16):
+        self.statics = statics
+        self.cell_size = cell_size
+        self.new_frame()
+
+    def new_frame(self):
+        self.cache = {}
+        self.snapshot = None
+        self.hits = self.misses = 0
+
+    def cell(self, (x, y)):
+        return int(x) // self.cell_size, int(y) // self.cell_size
+
+    def clear(self, start, dest):
+        key = (self.cell(start), self.cell(dest))
+        if key in self.cache:
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+
+        # Test between cell centers so the answer doesn't depend on which caller got here first
+        half = self.cell_size / 2
+        start = key[0][0] * self.cell_size + half, key[0][1] * self.cell_size + half
+        dest = key[1][0] * self.cell_size + half, key[1][1] * self.cell_size + half
+
+        if numpy is not None:
+            if self.snapshot is None:
+                self.snapshot = self.statics.packed() # Shared by every query this frame
+            blocked = segment_hits_packed(start, dest, self.snapshot)
+        else:
+            nearby = self.statics.index.query(twopointrect(start, dest).inflate(2, 2))
+            blocked = any(segment_hits_rect(start, dest, sprite.rect) for sprite in nearby)
+
+        self.cache[key] = not blocked
+        return not blocked
+
+def clearshot(start, dest, colliders):
+    """ True if there is a clear path from 'start' to 'dest' through the sprites in 'colliders' """
+    if isinstance(colliders, IndexedGroup):
+        return colliders.sightlines.clear(start, dest)
+
+    for sprite in colliders:
+        if segment_hits_rect(start, dest, sprite.rect):
+            return False
+    return True
@@ -3,9 +3,10 @@ import string
 from general import *
 from opponents import getOpponent, Commando
 from pygame.locals import *
-from player import States
-from powerup import Heart, Shotgun
+from player import States, Weapons
+from powerup import Heart, Shotgun, Bomb, SmartBomb
 from feeder import getFeeder
+from collision import masks_collide, groundbelow
 
 directions = (K_UP, K_DOWN, K_LEFT, K_RIGHT)
 specials =         "1234567890[]\;',./"
@@ -20,7 +21,7 @@ class Controller:
 
         loading_scene = LoadingScene(screen)
         loading_scene.draw()
-        pygame.display.update()
+        present(screen)
 
         self.scene    = PlatformingScene(screen)
         self.player   = self.scene.player
@@ -99,6 +100,8 @@ class Controller:
         if not self.free_movement:
             self.auto_move_player()
 
+        self.scene.broadphase.update()
+
         self.collide_player_with_enemies()
 
         self.collide_player_with_powerups()
@@ -136,7 +139,10 @@ class Controller:
 
     def collide_player_with_enemies(self):
         # TODO Retool this so it's more robust
-        colliders = pygame.sprite.spritecollide(self.player, self.scene.actives, True)
+        colliders = [enemy for player, enemy in self.scene.broadphase.pairs('player', 'actives')
+                     if masks_collide(player, enemy)]
+        for enemy in colliders:
+            enemy.kill()
 
         collision_hurt = False    # Was the collision with an actual, living enemy
         collision_special = False # Was the collision with a commando
@@ -159,8 +165,10 @@ class Controller:
             return
 
     def collide_player_with_powerups(self):
-        powerups = pygame.sprite.spritecollide(self.player, self.scene.powerups, True)
-        for powerup in powerups:
+        for player, powerup in self.scene.broadphase.pairs('player', 'powerups'):
+            if not masks_collide(player, powerup):
+                continue
+            powerup.kill()
             powerup.effect(self.scene, self.player)
 
     def spawn_enemies(self):            
@@ -205,7 +213,12 @@ class Controller:
 
         if len(self.spawners):
             EnemyType = random.choice(self.spawners) # 1/n chance of all enemy types
-            self.scene.actives.add(EnemyType(next_word, spawnpos, self.scene.statics))
+            enemy = EnemyType(next_word, spawnpos, self.scene.statics)
+            if enemy.placement is not None:
+                bottom = enemy.placement(enemy.rect, self.scene.statics)
+                if bottom is not None:
+                    enemy.settle(bottom)
+            self.scene.actives.add(enemy)
 
     def command(self, key):
         platform = self.scene.type_special(key)
@@ -258,17 +271,51 @@ class Controller:
             # Set up death animation, kill sprite eventually
             self.player.selected_opponent.destroy()
             self.player.idle()
+            self.area_effect(self.player.selected_opponent, self.player.weapon)
             
             if random.randint(0, 10) < 3: # Spawn a powerup when enemies die, sometimes.
                 spawnpos = self.player.selected_opponent.rect.center
                 if random.randint(0, 5) < 2:
-                    powerup = Shotgun
+                    powerup = random.choice((Shotgun, Bomb, SmartBomb))
                 else:
                     powerup = Heart
-                self.scene.powerups.add(powerup(spawnpos, self.scene.statics))
+                # Nothing to land on means it would just fall off the world
+                ground = groundbelow(pygame.rect.Rect(spawnpos, (0, 0)), self.scene.statics)
+                if ground is not None:
+                    self.scene.powerups.add(powerup((spawnpos[0], ground)))
 
             self.player.selected_opponent = None
 
+    def area_effect(self, target, weapon):
+        """ Whatever the killing shot on 'target' does to the opponents around it.
+            Opponents taken out this way don't give any word credit.
+        """
+        def alive(opponent):
+            return opponent.ttl is None and not isinstance(opponent, Commando)
+
+        index = self.scene.opponent_index
+        if weapon == Weapons.shotgun:
+            for opponent in index.radius(target.x, target.y, Weapons.knockback_radius):
+                if opponent is not target and alive(opponent):
+                    opponent.knockback((target.x, target.y), Weapons.knockback_distance)
+            return
+
+        if weapon == Weapons.explosive:
+            caught = index.chain([target], Weapons.blast_radius, alive)
+        elif weapon == Weapons.smartbomb:
+            x, y = self.player.rect.center
+            caught = [opponent for opponent in index.radius(x, y, game_constants.w) if alive(opponent)]
+            self.player.weapon = Weapons.normal # One bomb per powerup
+        else:
+            return
+
+        for opponent in caught:
+            if opponent is target:
+                continue
+            if opponent.typing:
+                opponent.release()
+            opponent.destroy()
+
     def type_normal(self, key):
         if not self.player.selected_opponent:
             self._find_opponent_for_key(key) 
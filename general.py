@@ -1,4 +1,5 @@
-import pygame, os, random
+import pygame, os, random, string, bisect
+from collections import OrderedDict
 
 class Color:
     """ A set of colors used in this game """
@@ -10,6 +11,8 @@ class Color:
     text_normal          = (255, 255, 255)
     text_typed           = (50, 50, 50)
     score_color          = (200, 200, 100)
+    far_hills            = (70, 70, 160)
+    near_hills           = (40, 45, 120)
 
     WORD_BACKGROUND      = (40, 30, 200)
 
@@ -53,34 +56,329 @@ def GetFont(pointSize):
         Fonts[pointSize] = pygame.font.Font('freesansbold.ttf', pointSize)
         return Fonts[pointSize]
 
+class GlyphAtlas:
+    """ Every printable character of a font, rendered once in one color and packed onto a single sheet
+        (the same layout as map_letters in pyogl-test). Text is put together by blitting glyphs off the
+        sheet, spaced by each character's advance plus the font's kerning for the pair.
+    """
+
+    sheet_width = 512
+
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self.height = font.get_height()
+
+        glyphs = [(char, font.render(char, 1, color)) for char in string.printable if char not in string.whitespace or char == ' ']
+        row = max(glyph.get_height() for char, glyph in glyphs)
+        startx, starty, rects = 0, 0, []
+        for char, glyph in glyphs:
+            if startx + glyph.get_width() > self.sheet_width:
+                startx, starty = 0, starty + row
+            rects.append(pygame.rect.Rect(startx, starty, glyph.get_width(), glyph.get_height()))
+            startx += glyph.get_width()
+
+        # Glyphs are copied on with MAX so their alpha lands on the sheet untouched
+        self.sheet = pygame.Surface((self.sheet_width, starty + row), pygame.SRCALPHA, 32)
+        self.sheet.fill((0, 0, 0, 0))
+        self.glyphs = {}
+        self.advances = {}
+        for (char, glyph), rect in zip(glyphs, rects):
+            self.sheet.blit(glyph, rect, special_flags = pygame.BLEND_RGBA_MAX)
+            self.glyphs[char] = self.sheet.subsurface(rect)
+            self.advances[char] = font.size(char)[0]
+        self.kerning = {}
+
+    def glyph(self, char):
+        if char not in self.glyphs: # Outside the sheet, so it gets its own surface
+            self.glyphs[char] = self.font.render(char, 1, self.color)
+            self.advances[char] = self.font.size(char)[0]
+        return self.glyphs[char]
+
+    def kern(self, left, right):
+        """ How much closer (negative) or further apart the font sets this pair than their advances say """
+        pair = left + right
+        if pair not in self.kerning:
+            self.kerning[pair] = self.font.size(pair)[0] - self.advances[left] - self.advances[right]
+        return self.kerning[pair]
+
+    def size(self, text):
+        width, height, prev = 0, self.height, None
+        for char in text:
+            height = max(height, self.glyph(char).get_height())
+            if prev is not None:
+                width += self.kern(prev, char)
+            width += self.advances[char]
+            prev = char
+        return width, height
+
+    def layout(self, text):
+        """ (glyph, x) for each character of 'text' """
+        x, prev = 0, None
+        for char in text:
+            if prev is not None:
+                x += self.kern(prev, char)
+            yield self.glyph(char), x
+            x += self.advances[char]
+            prev = char
+
+    def render(self, text):
+        """ Stand-in for font.render(text, 1, color) """
+        width, height = self.size(text)
+        surface = pygame.Surface((max(width, 1), height), pygame.SRCALPHA, 32)
+        surface.fill((0, 0, 0, 0))
+        for glyph, x in self.layout(text):
+            surface.blit(glyph, (x, 0), special_flags = pygame.BLEND_RGBA_MAX)
+        return surface
+
+Atlases = {}
+def GetGlyphAtlas(font, color):
+    key = (font, tuple(color))
+    if not Atlases.has_key(key):
+        Atlases[key] = GlyphAtlas(font, color)
+    return Atlases[key]
+
 class RenderUpdatesDraw(pygame.sprite.RenderClear):
-    """ Call sprite.draw(surface, campos) for each sprite, keep track of dirty areas. """
+    """ Call sprite.draw(surface, campos) for each sprite, keep track of dirty areas.
+        Sprites whose bounds() are nowhere in the surface's clip area (as seen from campos)
+        aren't drawn at all; 'culled' is how many were skipped by the last draw.
+    """
+
+    culled = 0
+
+    def visible(self, sprite, view):
+        bounds = getattr(sprite, 'bounds', None)
+        if bounds is None:
+            return True
+        bounds = bounds()
+        return bounds is None or bounds.colliderect(view)
 
     def draw(self, surface, campos):
         # "Dirty" will be a list of rects to send to pygame.display.update()
         dirty = self.lostsprites # Rects that have been deleted since last draw
         self.lostsprites = []
 
-        for sprite, rect in self.spritedict.items():
-            newrect = sprite.draw(surface, campos)
+        # What can be seen, in world coordinates, give or take a pixel for where draw() rounds a fractional position
+        view = surface.get_clip().move(campos[0], campos[1]).inflate(2, 2)
+        culled = 0
+
+        # This runs for every sprite every frame, so look everything up once. Iterating the dict
+        # in place is fine since drawing never adds or removes sprites, only updates their rects
+        spritedict, visible, draw_sprite, add = self.spritedict, self.visible, self.draw_sprite, dirty.append
+        for sprite, rect in spritedict.iteritems():
+            if visible(sprite, view):
+                newrect = draw_sprite(sprite, surface, campos)
+            else:
+                newrect = None
+                culled += 1
+
+            if newrect is None:
+                # Nothing drawn this time, so only wherever it was before needs updating; the
+                # clear has already taken it off, so there's nothing to remember for the next one
+                if rect is not 0:
+                    add(rect)
+                spritedict[sprite] = 0
+                continue
 
             if rect is 0:
                 # This sprite wasn't onscreen last frame, draw over where the sprite was
-                dirty.append(newrect)
+                add(newrect)
+            elif newrect.colliderect(rect):
+                add(newrect.union(rect))
             else:
-                # Assumes that last and current rects will always overlap.
-                # If not, faster to do a collide check first. See sprite.py.
-                dirty.append(newrect.union(rect))
+                # Moved clean away: two small rects beat one that spans the gap
+                add(rect)
+                add(newrect)
 
-            self.spritedict[sprite] = newrect
+            spritedict[sprite] = newrect
 
+        self.culled = culled
         return dirty
 
+    def draw_sprite(self, sprite, surface, campos):
+        return sprite.draw(surface, campos)
+
+    def clear(self, surface, bgd):
+        """ RenderClear.clear, in one blits call """
+        if callable(bgd):
+            return super(RenderUpdatesDraw, self).clear(surface, bgd)
+        rects = self.lostsprites + [rect for rect in self.spritedict.itervalues() if rect is not 0]
+        surface.blits([(bgd, rect, rect) for rect in rects], False)
+
+class DirtyRegions:
+    """ Boils a frame's dirty rects down to what's worth handing to pygame.display.update().
+        Rects are merged whenever their union costs no more than 'rect_cost' extra pixels over
+        updating them separately, and once the total passes 'full_ratio' of the screen the whole
+        screen is updated in one go instead. Counts for the last frame are kept for inspection.
+
+        Both numbers are guesses, not measurements: they weigh what the display costs per rect
+        against what it costs per pixel, and the dummy video driver the benchmarks run under
+        doesn't update anything. Worth timing against a real display before tuning them.
+    """
+
+    def __init__(self, bounds, rect_cost = 32 * 32, full_ratio = .5):
+        self.bounds = pygame.rect.Rect(bounds)
+        self.rect_cost = rect_cost
+        self.full_ratio = full_ratio
+
+        self.rects_in = 0  # Rects handed in
+        self.rects_out = 0 # Rects handed on to the display
+        self.area = 0      # Pixels covered by what was handed on
+        self.full = False  # Whether it was the whole screen
+
+    def coalesce(self, rects):
+        """ One sweep across the rects from left to right, merging each into the rects still open
+            behind the sweep, and closing those it's moved too far past for anything to reach
+        """
+        merged = []
+        open_rects = []
+        for rect in sorted((pygame.rect.Rect(rect) for rect in rects if rect.width and rect.height),
+                           key = lambda rect: rect.left):
+            # Merging across a gap costs at least the gap times the height, and gaps only get wider
+            still_open = []
+            for other in open_rects:
+                if (rect.left - other.right) * other.height > self.rect_cost:
+                    merged.append(other)
+                else:
+                    still_open.append(other)
+            open_rects = still_open
+
+            i = 0
+            while i < len(open_rects):
+                other = open_rects[i]
+                union = rect.union(other)
+                overlap = rect.clip(other)
+                if union.width * union.height <= rect.width * rect.height + other.width * other.height \
+                                                   - overlap.width * overlap.height + self.rect_cost:
+                    # Grown, so it might reach open rects that were already passed over
+                    rect = union
+                    open_rects.pop(i)
+                    i = 0
+                else:
+                    i += 1
+            open_rects.append(rect)
+        merged += open_rects
+
+        self.rects_in = len(rects)
+        self.area = sum(rect.width * rect.height for rect in merged)
+        self.full = self.area > self.bounds.width * self.bounds.height * self.full_ratio
+        if self.full:
+            merged = [self.bounds]
+            self.area = self.bounds.width * self.bounds.height
+        self.rects_out = len(merged)
+        return merged
+
+class ScaledDisplay(pygame.Surface):
+    """ Stands in for the screen at 1/'scale' of the window's size, for big windows on slow machines.
+        Scenes draw on it at that size, and update() blows just the dirty rects up onto the window:
+        scale2x when doubling, plain pixel doubling otherwise. Either way the result is the same as
+        scaling the whole frame, so dirty rects keep working.
+    """
+
+    def __init__(self, window, scale):
+        self.window = window
+        self.scale = scale
+        w, h = window.get_size()
+        pygame.Surface.__init__(self, (w / scale, h / scale), 0, window)
+        self.scratch = pygame.Surface((w / scale * scale, h / scale * scale), 0, window) # For scale2x to work in
+
+    def update(self, rects = None):
+        bounds = self.get_rect()
+        if rects is None:
+            rects = [bounds]
+        s = self.scale
+        updated = []
+        for rect in rects:
+            rect = pygame.rect.Rect(rect)
+            if not rect.width or not rect.height:
+                continue
+            if s == 2:
+                # scale2x looks at each pixel's neighbours, so the pixels around a change change too
+                rect.inflate_ip(2, 2)
+            rect = bounds.clip(rect)
+            target = pygame.rect.Rect(rect.x * s, rect.y * s, rect.width * s, rect.height * s)
+            if s == 2 and rect == bounds and self.window.get_size() == target.size:
+                pygame.transform.scale2x(self, self.window)
+            elif s == 2:
+                # ...and getting those right takes another pixel border, which is cut off again
+                source = rect.inflate(2, 2).clip(bounds)
+                scaled = pygame.transform.scale2x(self.subsurface(source), self.scratch.subsurface((0, 0, source.width * 2, source.height * 2)))
+                self.window.blit(scaled, target, ((rect.x - source.x) * 2, (rect.y - source.y) * 2, target.width, target.height))
+            else:
+                pygame.transform.scale(self.subsurface(rect), target.size, self.window.subsurface(target))
+            updated.append(target)
+        pygame.display.update(updated)
+
+def present(screen, rects = None):
+    """ Show what's been drawn on 'screen' (only 'rects' of it, if the display can do that) """
+    if isinstance(screen, ScaledDisplay):
+        screen.update(rects)
+    elif isinstance(screen, pygame.Surface):
+        pygame.display.update(rects)
+    else:
+        screen.flip()
+
+def draw_line(surface, color, start, end, width = 1):
+    """ pygame.draw.line, for anything a scene can draw on """
+    if isinstance(surface, pygame.Surface):
+        return pygame.draw.line(surface, color, start, end, width)
+    return surface.draw_line(color, start, end, width)
+
+class SpriteSheet:
+    """ A data directory's frames packed onto one image by packsprites.py.
+        Frames are subsurfaces of the sheet; flipped frames are subsurfaces of a mirrored copy of it.
+    """
+
+    def __init__(self, directory):
+        path = os.path.join('.', 'data', directory)
+        self.image = pygame.image.load(os.path.join(path, 'sheet.png')).convert_alpha()
+        self.flipped = None
+        self.rects = {}
+        for line in open(os.path.join(path, 'sheet.txt')):
+            name, x, y, w, h = line.split()
+            self.rects[name] = pygame.rect.Rect(int(x), int(y), int(w), int(h))
+
+    def frame(self, filename):
+        return self.image.subsurface(self.rects[filename])
+
+    def flip(self, frame):
+        """ 'frame' (off this sheet) mirrored left to right """
+        if self.flipped is None:
+            self.flipped = pygame.transform.flip(self.image, True, False)
+        x, y = frame.get_offset()
+        w, h = frame.get_size()
+        return self.flipped.subsurface((self.image.get_width() - x - w, y, w, h))
+
+Sheets = {}
+def GetSpriteSheet(directory):
+    """ The packed sheet for 'directory', or None if packsprites.py hasn't been run on it """
+    if not Sheets.has_key(directory):
+        if os.path.exists(os.path.join('.', 'data', directory, 'sheet.txt')):
+            Sheets[directory] = SpriteSheet(directory)
+        else:
+            Sheets[directory] = None
+    return Sheets[directory]
+
 def flippedframes(surfaces):
-    return [pygame.transform.flip(image, True, False) for image in surfaces]
+    flipped = []
+    for image in surfaces:
+        sheets = [sheet for sheet in Sheets.values() if sheet is not None and sheet.image is image.get_parent()]
+        if sheets:
+            flipped.append(sheets[0].flip(image))
+        else:
+            flipped.append(pygame.transform.flip(image, True, False))
+    return flipped
 
 def loadframes(directory, filenames):
-    return [pygame.image.load(os.path.join('.', 'data', directory, filename)).convert_alpha() for filename in filenames]
+    """ Frames off the directory's sheet, or loaded from their own files if they aren't on it """
+    sheet = GetSpriteSheet(directory)
+    frames = []
+    for filename in filenames:
+        if sheet is not None and filename in sheet.rects:
+            frames.append(sheet.frame(filename))
+        else:
+            frames.append(pygame.image.load(os.path.join('.', 'data', directory, filename)).convert_alpha())
+    return frames
 
 class WrappedSprite(pygame.sprite.Sprite):
     """ Wrapper around pygame.sprite.Sprite to consolidate methods specific to this game """
@@ -90,6 +388,7 @@ class WrappedSprite(pygame.sprite.Sprite):
             getattr(self, 'images_loaded')
         except AttributeError:
             self.loadImages()
+            self.loadMasks()
 
         super(WrappedSprite, self).__init__()
 
@@ -98,6 +397,34 @@ class WrappedSprite(pygame.sprite.Sprite):
         cls.images = {}
         cls.images_loaded = True
 
+    def bounds(self):
+        """ The world rect draw() will cover, or None if that can't be told without drawing """
+        return None
+
+    @classmethod
+    def loadMasks(cls):
+        """ Build a collision mask for every frame in cls.images, keyed by the frame's surface """
+        cls.masks = {}
+        for frames in cls.images.values():
+            if not isinstance(frames, list):
+                frames = [frames]
+            for frame in frames:
+                cls.masks[frame] = pygame.mask.from_surface(frame)
+
+    def animmask(self, anim):
+        """ (mask, world topleft) of the frame 'anim' is showing, drawn at this sprite's rect """
+        mask = self.masks.get(anim.images[anim.current_frame])
+        if mask is None:
+            return None
+        return mask, (self.rect.left + anim.offset[0], self.rect.top + anim.offset[1])
+
+    def collision_mask(self):
+        """ Pixel mask for narrowphase collisions, or None to collide as a plain rect """
+        anim = getattr(self, 'current_anim', None)
+        if anim is None:
+            return None
+        return self.animmask(anim)
+
 class Anim(WrappedSprite):
     """ Collection of frames meant to be displayed sequentially through time """
 
@@ -130,9 +457,16 @@ class Anim(WrappedSprite):
                 height = image.get_height()
         return pygame.rect.Rect(0, 0, width, height)
 
+    def frame_rect(self, position):
+        """ Where draw() would put the current frame """
+        image = self.images[self.current_frame]
+        return pygame.rect.Rect(position[0] + self.offset[0], position[1] + self.offset[1],
+                                image.get_width(), image.get_height())
+
     def draw(self, surface, position):
+        """ Blit the current frame with its top-left at 'position' (plus the offset) """
         if self.delay:
-            return pygame.rect.Rect((position.topleft), (0, 0))
+            return pygame.rect.Rect(position[0], position[1], 0, 0)
         else:
             return surface.blit(self.images[self.current_frame], (position[0] + self.offset[0], position[1] + self.offset[1]))
 
@@ -156,9 +490,19 @@ class Anim(WrappedSprite):
 class Box(WrappedSprite):
     """ A boundary rect that can draw itself to the screen when given a camera position """
 
+    # Boxes are drawn from their tiles composed once onto a single surface, shared by every box of the
+    # same width. Only the most recently used widths are kept around for new boxes.
+    tiled = OrderedDict()
+    max_tiled = 32
+    max_width = 1024 # Wider than this gets drawn in runs of this many pixels instead
+
     def __init__(self, x, y, w, h):
         super(Box, self).__init__()
         self.rect = pygame.rect.Rect((x, y, w, h))
+        if 16 <= w <= self.max_width:
+            self.image = self.tiles(w / 16, True)
+        else:
+            self.image = None
 
     @classmethod
     def loadImages(cls):
@@ -166,18 +510,53 @@ class Box(WrappedSprite):
         cls.images['smbas']      = loadframes('platforms', ('smbas.png',))[0]
         cls.images['smbas_edge'] = loadframes('platforms', ('smbas_edge.png',))[0]
 
+    @classmethod
+    def tiles(cls, n, edges):
+        """ 'n' tiles in a row, the outer two being edge tiles if 'edges' """
+        key = (n, edges)
+        if key in cls.tiled:
+            image = cls.tiled.pop(key)
+        else:
+            # The edge tile has see-through parts, so copy alpha and all (MAX onto nothing copies as-is)
+            image = pygame.Surface((n * 16, 16), pygame.SRCALPHA, 32)
+            image.fill((0, 0, 0, 0))
+            for i in xrange(n):
+                if edges and (i == 0 or i == n - 1):
+                    image.blit(cls.images['smbas_edge'], (i * 16, 0), special_flags = pygame.BLEND_RGBA_MAX)
+                else:
+                    image.blit(cls.images['smbas'], (i * 16, 0), special_flags = pygame.BLEND_RGBA_MAX)
+            if len(cls.tiled) >= cls.max_tiled:
+                cls.tiled.popitem(last = False)
+        cls.tiled[key] = image
+        return image
+
+    def draw_overlay(self, surface, campos):
+        """ Whatever goes on top of the tiles. A plain box has nothing """
+        return None
+
     def draw(self, surface, campos):
         moved = self.rect.move(-campos[0], -campos[1])
-        w = moved.width
-        for i in xrange(w / 16):
-            if i == 0 or i == (w / 16 - 1):
-                surface.blit(self.images['smbas_edge'], (moved.left + i * 16, moved.top))
-            else:
-                surface.blit(self.images['smbas'], (moved.left + i * 16, moved.top))
+        if self.image:
+            surface.blit(self.image, moved.topleft)
+        elif moved.width >= 16:
+            # Edges, then the middle in runs, skipping whatever is off the surface
+            n = moved.width / 16
+            surface.blit(self.images['smbas_edge'], moved.topleft)
+            surface.blit(self.images['smbas_edge'], (moved.left + (n - 1) * 16, moved.top))
+
+            run = self.tiles(self.max_width / 16, False)
+            left, right = moved.left + 16, moved.left + (n - 1) * 16
+            clip = surface.get_clip()
+            x = left + max(0, clip.left - left) / self.max_width * self.max_width
+            while x < min(right, clip.right):
+                surface.blit(run, (x, moved.top), pygame.rect.Rect(0, 0, min(self.max_width, right - x), 16))
+                x += self.max_width
         return moved
 
 class Score(pygame.sprite.Sprite):
-    """ Displays score in the upper-right of screen. Draw function requires total elapsed time since game start. """
+    """ Displays score in the upper-right of screen. tick() needs the total elapsed time since game start.
+        'changed' is set whenever one of the counters shows something new, for whoever draws it to reset.
+    """
 
     def __init__(self, surface, color = Color.score_color):
         super(Score, self).__init__()
@@ -186,16 +565,15 @@ class Score(pygame.sprite.Sprite):
         self.color = color
         self.score = 0.0
         self.misses = 0
+        self.wpm = 0
         self.frames = 0
         self.render_initial(surface)
-        self.drawscore, self.drawmiss, self.drawwpm = (True, True, True)
-
-        self.drawn_once = False
+        self.changed = True
 
     def render_initial(self, surface):
         self.rendered_score =  self.font.render("Score: %.2f" % self.score,  1, self.color)
         self.rendered_misses = self.font.render("Misses: %i"  % self.misses, 1, self.color)
-        self.rendered_wpm =    self.font.render("WPM: %3i"    % 0,           1, self.color)
+        self.rendered_wpm =    self.font.render("WPM: %3i"    % self.wpm,    1, self.color)
 
         left_edge = surface.get_rect().right - self.rendered_wpm.get_rect().width * 1.5
         self.wpm_rect = self.rendered_wpm.get_rect(top = 5, left = left_edge)
@@ -207,47 +585,28 @@ class Score(pygame.sprite.Sprite):
     def increase(self, value):
         self.score += value
         self.rendered_score = self.font.render("Score: %.2f" % self.score, 1, self.color)
-        self.drawscore = True
+        self.changed = True
 
     def miss(self):
         self.misses += 1
         self.rendered_misses = self.font.render("Misses: %i" % self.misses, 1, self.color)
-        self.drawmiss = True
-
-    def clear(self, surface, background):
-        if not self.drawn_once: return
-
-        if self.drawscore:
-            surface.blit(background, self.score_rect)
-        if self.drawmiss:
-            surface.blit(background, self.miss_rect)
-        if self.drawwpm:
-            surface.blit(background, self.wpm_rect)
+        self.changed = True
 
-    def draw(self, surface, elapsed):
+    def tick(self, elapsed):
+        """ WPM is worked out every 60 frames, and only rendered again if the number shown is different """
         self.frames += 1
-
-        if self.frames > 60: # Choose whether to draw wpm next frame
-            self.rendered_wpm = self.font.render("WPM: %3i" % (self.score / (elapsed / 60)), 1, self.color)
-            self.drawwpm = True
+        if self.frames > 60:
             self.frames = 0
+            wpm = int(self.score / (elapsed / 60))
+            if wpm != self.wpm:
+                self.wpm = wpm
+                self.rendered_wpm = self.font.render("WPM: %3i" % self.wpm, 1, self.color)
+                self.changed = True
 
-        dirty = []
-        if self.drawwpm:
-            dirty += [surface.blit(self.rendered_wpm, self.wpm_rect)]
-            self.drawwpm = True
-
-        if self.drawmiss:
-            dirty += [surface.blit(self.rendered_misses, self.miss_rect)]
-            self.drawmiss = True
-
-        if self.drawscore:
-            dirty += [surface.blit(self.rendered_score, self.score_rect)]
-            self.drawscore = True
-
-        self.drawn_once = True
-
-        return dirty
+    def draw(self, surface):
+        return [surface.blit(self.rendered_wpm, self.wpm_rect),
+                surface.blit(self.rendered_misses, self.miss_rect),
+                surface.blit(self.rendered_score, self.score_rect)]
 
 # WordMaker:
 # this could possibly be folded into Word, or extended to keep better track of what
@@ -272,103 +631,178 @@ class Word(pygame.sprite.Sprite):
     """ A string that keeps track of how much of it has been completed,
           as well as its current rendered image.
         A word can be drawn to the screen or 'typed on'
+
+        Strings of line_char_limit characters or more are sentences: they're broken into lines once,
+        each line keeps its own image, and typing a character only renders the line it's on again.
+        A sentence's badge is just the background and border with the lines drawn over it, so
+        draw_changed() can put the retyped lines on the screen without the rest.
     """
 
     def __init__(self, text, font = None):
         super(Word, self).__init__()
 
         self.font = font or GetFont(24)
+        self.typed = GetGlyphAtlas(self.font, Color.text_typed)
+        self.untyped = GetGlyphAtlas(self.font, Color.text_normal)
         self.borderwidth = self.font.get_height() / 5
 
         self.string = text
-        self.rect = None
+        if len(text) < game_constants.line_char_limit:
+            self.lines = None
+        else:
+            self.lines = self.split_sentence(text)
+            self.line_starts = [start for start, end in self.lines]
         self.reset()
 
-    def split_sentence(self, sentence, offset = 0):
-        def str_len_line(line):
-            return sum([len(x) for x in line])
-
-        result = []
-        line = []
-        splitwords = sentence.split(" ")
-        for word in splitwords:
-            if (str_len_line(line) + len(word)) > game_constants.line_char_limit:
-                result.append(" ".join(line))
-                line = []
-            elif (str_len_line(line) + len(word) + offset) > game_constants.line_char_limit:
-                offset = 0
-                result.append(" ".join(line))
-                line = []
-            line.append(word)
-        if line:
-            result.append(" ".join(line))
-        return result
+    @staticmethod
+    def split_sentence(sentence, limit = None):
+        """ (start, end) of each line of 'sentence', broken between words so that lines are no longer
+            than 'limit' where they can be. The space a line is broken at isn't on either line.
+        """
+        limit = limit or game_constants.line_char_limit
+        lines = []
+        start = end = position = 0
+        for word in sentence.split(" "):
+            if end > start and position + len(word) - start > limit:
+                lines.append((start, end))
+                start = position
+            end = position + len(word)
+            position = end + 1
+        lines.append((start, end))
+        return lines
 
     def reset(self):
+        self.badge = None
         self.strpos = 0
-        self.ltext = []
-        right_side_string = self.split_sentence(self.string)
-        self.rtext = [self.font.render(line, 1, Color.text_normal) for line in right_side_string]
-
-    def _rerender_sentence(self):
-        if self.strpos > 0:
-            left_side_string = self.split_sentence(self.string[:self.strpos])
-            self.ltext = [self.font.render(line, 1, Color.text_typed) for line in left_side_string]
-            right_side_string = self.split_sentence(self.string[self.strpos:], len(left_side_string[-1]))
+        self.changed = []
+        if self.lines is None:
+            self.ltext = []
+            self.rtext = [self.untyped.render(self.string)]
         else:
-            right_side_string = self.split_sentence(self.string)
-            self.rtext = [self.font.render(line, 1, Color.text_normal) for line in right_side_string]
+            self.line_images = [self.render_line(start, end) for start, end in self.lines]
+
+    def render_line(self, start, end):
+        """ Characters start to end of the string, in the typed color up to strpos. Glyphs go where
+            the line would have them in one color, so typing doesn't shift anything over.
+        """
+        text = self.string[start:end]
+        width, height = self.untyped.size(text)
+        surface = pygame.Surface((max(width, 1), height), pygame.SRCALPHA, 32)
+        surface.fill((0, 0, 0, 0))
+        typed = self.strpos - start
+        for i, (glyph, x) in enumerate(self.untyped.layout(text)):
+            if i < typed:
+                glyph = self.typed.glyph(text[i])
+            surface.blit(glyph, (x, 0), special_flags = pygame.BLEND_RGBA_MAX)
+        return surface
 
     def rerender(self):
-        if len(self.string) < game_constants.line_char_limit:
-            self.ltext = [self.font.render(self.string[:self.strpos], 1, Color.text_typed)]
-            self.rtext = [self.font.render(self.string[self.strpos:], 1, Color.text_normal)]
-        else:
-            self._rerender_sentence()
+        self.badge = None
+        self.ltext = [self.typed.render(self.string[:self.strpos])]
+        self.rtext = [self.untyped.render(self.string[self.strpos:])]
+
+    def rerender_line(self, position):
+        """ Render the line with the character at 'position' on it again, if there is one """
+        line = bisect.bisect_right(self.line_starts, position) - 1
+        start, end = self.lines[line]
+        if position >= end: # The space between two lines
+            return
+        self.line_images[line] = self.render_line(start, end)
+        if line not in self.changed:
+            self.changed.append(line)
 
     def draw(self, surface, (x, y), border_color = Color.word_unselect):
+        if self.badge is None or self.badge_color != border_color:
+            self.compose(border_color)
+        screen_rect = self.badge_rect.move(x, y)
+        surface.blit(self.badge, screen_rect)
+        if self.lines is not None:
+            for image, rect in zip(self.line_images, self.line_rects):
+                surface.blit(image, rect.move(x, y))
+            self.changed = []
+        return screen_rect
+
+    def draw_changed(self, surface, (x, y)):
+        """ For a sentence that's already on 'surface' at (x, y), draw just the lines that have been
+            typed on since; returns where they went. Anything else draws the whole word.
+        """
+        if self.lines is None or self.badge is None:
+            return [self.draw(surface, (x, y))]
+        rects = []
+        for line in self.changed:
+            rect = self.line_rects[line]
+            # The badge is the same under a line whatever's typed, so it covers what was there
+            surface.blit(self.badge, rect.move(x, y), rect.move(-self.badge_rect.left, -self.badge_rect.top))
+            rects.append(surface.blit(self.line_images[line], rect.move(x, y)))
+        self.changed = []
+        return rects
+
+    def bounds(self, (x, y)):
+        """ Where draw() would put the word at (x, y), if it's been drawn since it last changed """
+        if self.badge is None:
+            return None
+        return self.badge_rect.move(x, y)
+
+    def layout(self):
+        """ The images of the lines and where they go around (0, 0) """
+        x, y = 0, 0
+        if self.lines is not None:
+            # Sentences hang down from a first line centered on (0, 0)
+            rects = [self.line_images[0].get_rect(centerx = x, centery = y)]
+            for image in self.line_images[1:]:
+                rects.append(image.get_rect(centerx = x, top = rects[-1].bottom))
+            return self.line_images, rects
+
         if self.ltext:
             ltext_rects = [self.ltext[0].get_rect(centerx = x, centery = y)]
-        else:
-            ltext_rects = []
-        for i, line in enumerate(self.ltext[1:]):
-            ltext_rects.append(line.get_rect(centerx = x, centery = y + self.ltext_rects[i].height))
-        if self.ltext:
             rtext_rects = [self.rtext[0].get_rect(left = ltext_rects[-1].right, centery = ltext_rects[-1].centery)]
-        else:
-            rtext_rects = [self.rtext[0].get_rect(centerx = x, centery = y)]
-        for i, line in enumerate(self.rtext[1:]):
-            rtext_rects.append(line.get_rect(centerx = x, top = rtext_rects[i].bottom))
 
-        # Perform correction on edge
-        if ltext_rects and rtext_rects:
+            # Perform correction on edge
             w = ltext_rects[-1].width + rtext_rects[0].width
             ltext_rects[-1].left = x - w / 2
             rtext_rects[0].right = x + w / 2
+        else:
+            ltext_rects = []
+            rtext_rects = [self.rtext[0].get_rect(centerx = x, centery = y)]
+        return self.ltext + self.rtext, ltext_rects + rtext_rects
 
-        allrects = ltext_rects + rtext_rects
+    def compose(self, border_color):
+        """ Lay out the lines around (0, 0) and paint the background and border onto the badge that
+            draw() blits until the word changes. A short word's text goes on the badge too.
+        """
+        images, allrects = self.layout()
 
         rect_inflation = (8 + self.borderwidth, 5 + self.borderwidth)
         if len(allrects) == 1:
-            self.rect = allrects[0].inflate(rect_inflation)
+            rect = allrects[0].inflate(rect_inflation)
         else:
-            self.rect = allrects[0].unionall(allrects[1:]).inflate(rect_inflation)
-
-        surface.fill(Color.WORD_BACKGROUND, self.rect)
-        screen_rect = pygame.draw.rect(surface, border_color, self.rect, self.borderwidth)
-
-        for line, rect in zip(self.ltext, ltext_rects):
-            surface.blit(line, rect)
-        for line, rect in zip(self.rtext, rtext_rects):
-            surface.blit(line, rect)
+            rect = allrects[0].unionall(allrects[1:]).inflate(rect_inflation)
 
+        # The border is stroked centered on the rect's edge, so part of it falls outside
         # HACK? or bug in pygame (i assume I meant the +1...)
-        return screen_rect.inflate(self.borderwidth + 1, self.borderwidth + 1)
+        badge_rect = rect.inflate(self.borderwidth + 1, self.borderwidth + 1)
+        self.badge = pygame.Surface(badge_rect.size, pygame.SRCALPHA, 32)
+        self.badge.fill((0, 0, 0, 0))
+        origin = (-badge_rect.left, -badge_rect.top)
+
+        self.badge.fill(Color.WORD_BACKGROUND, rect.move(origin))
+        pygame.draw.rect(self.badge, border_color, rect.move(origin), self.borderwidth)
+        if self.lines is None:
+            for line, rect in zip(images, allrects):
+                self.badge.blit(line, rect.move(origin))
+        else:
+            self.line_rects = allrects
+
+        self.badge_color = border_color
+        self.badge_rect = badge_rect
 
     def typeon(self, char):
         if char == self.string[self.strpos]:
             self.strpos += 1
-            self.rerender()
+            if self.lines is None:
+                self.rerender()
+            else:
+                self.rerender_line(self.strpos - 1)
             return True
         return False
 
@@ -0,0 +1,325 @@
+""" OpenGL drawing for the game, grown out of pyogl-test.
+
+    GLCanvas stands in for the display Surface: scenes blit and fill onto it exactly as they would
+    onto the screen, and it turns that into textured quads. Every surface it's handed is uploaded
+    as a texture the first time it's seen, and quads are batched until the texture (or clip) changes.
+    Unlike the screen it doesn't keep anything between frames, so scenes have to draw everything.
+    Surfaces are assumed not to change after they're first drawn; make a new one instead.
+
+    TextBatch is for drawing lots of text straight off GlyphAtlas sheets, a draw call per sheet.
+"""
+
+import pygame
+from pygame.locals import *
+from collections import OrderedDict
+
+try:
+    from OpenGL import GL as gl
+    from OpenGL import GLU as glu
+except ImportError:
+    gl = glu = None
+
+def makeTexture(textureBytes, w, h):
+    texture = gl.glGenTextures(1)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+    # Sprites are drawn 1:1, so don't let neighbouring frames on a sheet bleed in
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+    gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA, w, h, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, textureBytes)
+    return texture
+
+def gl_init((width, height)):
+    if height == 0:
+        height = 1
+    gl.glViewport(0, 0, width, height)
+
+    # Window-sized ortho projection with the origin top-left, same as pygame's
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glLoadIdentity()
+    glu.gluOrtho2D(0, width, height, 0)
+
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glLoadIdentity()
+
+    # Quads go down painter-style in the order they were blitted, so no depth test
+    gl.glDisable(gl.GL_DEPTH_TEST)
+    gl.glEnable(gl.GL_BLEND)
+    gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    gl.glEnable(gl.GL_TEXTURE_2D)
+    gl.glTexEnvf(gl.GL_TEXTURE_ENV, gl.GL_TEXTURE_ENV_MODE, gl.GL_MODULATE)
+
+    gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+    gl.glClearColor(0.0, 0.0, 0.0, 1.0)
+
+class TexturedQuad:
+    """ A whole surface uploaded as a texture """
+
+    def __init__(self, surface):
+        self.w, self.h = surface.get_size()
+        self.texture_id = makeTexture(pygame.image.tostring(surface, "RGBA", False), self.w, self.h)
+
+    def texcoords(self, area):
+        """ Texture coordinates of the corners of 'area' (in pixels) """
+        umin, vmin = area.left / float(self.w), area.top / float(self.h)
+        umax, vmax = area.right / float(self.w), area.bottom / float(self.h)
+        return [(umin, vmin), (umin, vmax), (umax, vmax), (umax, vmin)]
+
+    def delete(self):
+        gl.glDeleteTextures([self.texture_id])
+
+    def bytes(self):
+        return self.w * self.h * 4
+
+class TextureManager:
+    """ Keeps track of which surfaces have textures on the card, and how much room they take.
+        hold() pins a texture (glyph sheets, backgrounds) until every hold on it is released.
+        Unpinned textures whose surface hasn't been drawn for 'stale_frames' frames are deleted,
+        since most surfaces that stop being drawn (old word badges, retyped lines) are gone for good.
+        Past 'budget' bytes the least recently drawn unpinned textures go too, never ones drawn
+        this frame since they may still be waiting in a batch.
+    """
+
+    stale_frames = 120
+
+    def __init__(self, budget = 64 * 1024 * 1024):
+        self.budget = budget
+        self.entries = OrderedDict() # surface -> [TexturedQuad, holds, frame last drawn], least recent first
+        self.resident = 0
+        self.frame = 0
+
+        self.uploads = 0
+        self.evictions = 0
+
+    def get(self, surface):
+        """ The texture for 'surface', uploading it if need be """
+        if surface in self.entries:
+            entry = self.entries.pop(surface)
+        else:
+            entry = [TexturedQuad(surface), 0, self.frame]
+            self.resident += entry[0].bytes()
+            self.uploads += 1
+        entry[2] = self.frame
+        self.entries[surface] = entry
+        if self.resident > self.budget:
+            self.evict()
+        return entry[0]
+
+    def hold(self, surface):
+        quad = self.get(surface)
+        self.entries[surface][1] += 1
+        return quad
+
+    def release(self, surface):
+        self.entries[surface][1] -= 1
+
+    def evict(self):
+        for surface, (quad, holds, frame) in self.entries.items():
+            if self.resident <= self.budget:
+                break
+            if holds or frame == self.frame:
+                continue
+            self.delete(surface)
+
+    def delete(self, surface):
+        quad = self.entries.pop(surface)[0]
+        quad.delete()
+        self.resident -= quad.bytes()
+        self.evictions += 1
+
+    def next_frame(self):
+        self.frame += 1
+        for surface, (quad, holds, frame) in self.entries.items():
+            if self.frame - frame <= self.stale_frames:
+                break # Least recently drawn first, so everything after this is newer
+            if holds:
+                continue
+            self.delete(surface)
+
+def quad_vertices(position_rect):
+    """ Corners of 'position_rect' in the same winding as TexturedQuad.texcoords """
+    x, y, w, h = position_rect
+    return [(x, y), (x, y + h), (x + w, y + h), (x + w, y)]
+
+def rgba(color):
+    if isinstance(color, pygame.Color):
+        return tuple(color)
+    return tuple(pygame.Color(*color))
+
+class GLCanvas(object):
+    """ Drawn on like the display Surface, shown with flip() """
+
+    def __init__(self, size):
+        pygame.display.set_mode(size, OPENGL | DOUBLEBUF)
+        gl_init(size)
+
+        self.rect = pygame.rect.Rect((0, 0), size)
+        self.clip = pygame.rect.Rect(self.rect)
+        self.textures = TextureManager()
+
+        # The batch being built: everything in it shares 'batch_key'
+        self.batch_key = None
+        self.vertices = []
+        self.texcoords = []
+
+        self.draw_calls = 0
+        self.batches = 0 # Draw calls last frame
+
+    # The parts of the Surface interface scenes use
+
+    def get_rect(self, **kwargs):
+        rect = pygame.rect.Rect(self.rect)
+        for attribute, value in kwargs.items():
+            setattr(rect, attribute, value)
+        return rect
+
+    def get_size(self):
+        return self.rect.size
+
+    def get_width(self):
+        return self.rect.width
+
+    def get_height(self):
+        return self.rect.height
+
+    def get_clip(self):
+        return pygame.rect.Rect(self.clip)
+
+    def set_clip(self, *rect):
+        if not rect or rect[0] is None:
+            clip = pygame.rect.Rect(self.rect)
+        else:
+            clip = pygame.rect.Rect(*rect).clip(self.rect)
+        if clip != self.clip:
+            self.flush()
+            self.clip = clip
+
+    def blit(self, source, dest, area = None, special_flags = 0):
+        if area is None:
+            area = source.get_rect()
+        else:
+            area = pygame.rect.Rect(area).clip(source.get_rect())
+        position = pygame.rect.Rect(dest[0], dest[1], area.width, area.height)
+
+        # Subsurfaces are drawn straight off their parent's texture
+        offset = source.get_abs_offset()
+        source = source.get_abs_parent()
+        quad = self.textures.get(source)
+
+        alpha = source.get_alpha()
+        if alpha is None or source.get_flags() & SRCALPHA:
+            alpha = 255
+        self.add(('texture', quad.texture_id, alpha),
+                 quad_vertices(position), quad.texcoords(area.move(offset)))
+        return position.clip(self.clip)
+
+    def blits(self, blit_sequence, doreturn = 1):
+        rects = [self.blit(*blit) for blit in blit_sequence]
+        if doreturn:
+            return rects
+
+    def fill(self, color, rect = None, special_flags = 0):
+        rect = pygame.rect.Rect(self.rect if rect is None else rect)
+        self.add(('fill', rgba(color)), quad_vertices(rect))
+        return rect.clip(self.clip)
+
+    def draw_line(self, color, start, end, width = 1):
+        """ Stand-in for pygame.draw.line, see general.draw_line """
+        self.add(('line', rgba(color), width), [start, end])
+        return pygame.rect.Rect(min(start[0], end[0]), min(start[1], end[1]),
+                                abs(start[0] - end[0]) + 1, abs(start[1] - end[1]) + 1).clip(self.clip)
+
+    # Batching
+
+    def add(self, key, vertices, texcoords = None):
+        if key != self.batch_key:
+            self.flush()
+            self.batch_key = key
+        self.vertices.extend(vertices)
+        if texcoords:
+            self.texcoords.extend(texcoords)
+
+    def flush(self):
+        if not self.vertices:
+            self.batch_key = None
+            return
+
+        x, y, w, h = self.clip
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        gl.glScissor(x, self.rect.height - y - h, w, h)
+
+        kind = self.batch_key[0]
+        if kind == 'texture':
+            gl.glEnable(gl.GL_TEXTURE_2D)
+            gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+            gl.glBindTexture(gl.GL_TEXTURE_2D, self.batch_key[1])
+            gl.glColor4ub(255, 255, 255, self.batch_key[2])
+            gl.glTexCoordPointerf(self.texcoords)
+            gl.glVertexPointerf(self.vertices)
+            gl.glDrawArrays(gl.GL_QUADS, 0, len(self.vertices))
+            gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        else:
+            gl.glDisable(gl.GL_TEXTURE_2D)
+            gl.glColor4ub(*self.batch_key[1])
+            gl.glVertexPointerf(self.vertices)
+            if kind == 'fill':
+                gl.glDrawArrays(gl.GL_QUADS, 0, len(self.vertices))
+            else:
+                gl.glLineWidth(self.batch_key[2])
+                gl.glDrawArrays(gl.GL_LINES, 0, len(self.vertices))
+            gl.glEnable(gl.GL_TEXTURE_2D)
+
+        self.draw_calls += 1
+        self.batch_key = None
+        self.vertices = []
+        self.texcoords = []
+
+    def flip(self):
+        self.flush()
+        pygame.display.flip()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        self.textures.next_frame()
+        self.batches, self.draw_calls = self.draw_calls, 0
+
+class TextBatch:
+    """ Strings queued up from GlyphAtlases and drawn all at once, one vertex array per glyph sheet """
+
+    def __init__(self, textures):
+        self.textures = textures
+        self.held = set()
+        self.arrays = OrderedDict() # sheet -> (vertices, texcoords)
+
+    def add(self, atlas, text, (x, y)):
+        """ Queue 'text' with its top-left at (x, y); returns its width """
+        width = 0
+        for glyph, gx in atlas.layout(text):
+            sheet = glyph.get_abs_parent()
+            if sheet not in self.held: # Sheets stay resident as long as there's a batch drawing from them
+                self.textures.hold(sheet)
+                self.held.add(sheet)
+            quad = self.textures.get(sheet)
+            area = pygame.rect.Rect(glyph.get_abs_offset(), glyph.get_size())
+            vertices, texcoords = self.arrays.setdefault(sheet, ([], []))
+            vertices.extend(quad_vertices((x + gx, y, area.width, area.height)))
+            texcoords.extend(quad.texcoords(area))
+            width = gx + area.width
+        return width
+
+    def draw(self):
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glColor4ub(255, 255, 255, 255)
+        for sheet, (vertices, texcoords) in self.arrays.items():
+            gl.glBindTexture(gl.GL_TEXTURE_2D, self.textures.get(sheet).texture_id)
+            gl.glTexCoordPointerf(texcoords)
+            gl.glVertexPointerf(vertices)
+            gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        draw_calls = len(self.arrays)
+        self.arrays.clear()
+        return draw_calls
+
+    def close(self):
+        for sheet in self.held:
+            self.textures.release(sheet)
+        self.held.clear()
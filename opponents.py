@@ -1,7 +1,7 @@
 import pygame, random, math
 from general import RenderUpdatesDraw, game_constants, Color, Anim, loadframes, flippedframes, n_of, WrappedSprite
 from player import Weapons, States
-from collision import distfromground, clearshot
+from collision import ContactCache, clearshot, sweep, groundbelow, freeabove, overlapping
 
 def rand_offset(value):
     return (random.randint(-value, value), random.randint(-value, value))
@@ -20,9 +20,13 @@ class Opponent(WrappedSprite):
     """ A holder of a word, along with the game logic for moving around the screen and such. """
 
     name = "Nothing"
+    grounded = False # Walks on the statics, so the scene hands tick() its ground distance
+    placement = None # Collision query (freeabove, groundbelow) the spawner uses to find it a spot
+
     def __init__(self, word, (x, y), statics, speed = 2.0):
         super(Opponent, self).__init__()
         self.statics = statics
+        self.contacts = ContactCache()
         self.word = word
         self.typing = False
         self.speed = speed
@@ -32,6 +36,11 @@ class Opponent(WrappedSprite):
         self.rect.center = (self.x, self.y) # Smaller rect used for collision, NOT DRAWING
         self.ttl = None # Time to live when killed
 
+    def settle(self, bottom):
+        """ Move straight up or down to stand at 'bottom', wherever its placement query found """
+        self.y = float(bottom)
+        self.rect.bottom = self.y
+
     def draw(self, surface, camera):
         drawx, drawy = self.x - camera[0], self.y - camera[1]
         if self.typing:
@@ -43,12 +52,28 @@ class Opponent(WrappedSprite):
         opprect = pygame.draw.circle(surface, (200, 200, 200), (int(drawx), int(drawy)), 3).inflate(3, 3)
         return wordrect.union(opprect)
 
+    def bounds(self):
+        word = self.word.bounds((self.x, self.y - 10))
+        if word is None:
+            return None
+        return word.union((int(self.x) - 7, int(self.y) - 7, 15, 15))
+
     def hit(self, weapon, shooter):
         if weapon == Weapons.normal:
             self.pause = 20
         elif weapon == Weapons.shotgun:
             self.pause = 40
 
+    def knockback(self, (fromx, fromy), distance):
+        """ Get blasted 'distance' directly away from a point """
+        xdist, ydist = self.x - fromx, self.y - fromy
+        length = math.hypot(xdist, ydist) or 1.0
+        self.push(xdist / length * distance, ydist / length * distance)
+
+    def push(self, xdist, ydist):
+        self.x += xdist
+        self.y += ydist
+
     def typeon(self, char):
         if not self.word.done():
             if char == self.word.string[0]:
@@ -86,7 +111,8 @@ class Opponent(WrappedSprite):
         self.typing = False
         self.word.reset()
 
-    def tick(self, (xt, yt)):
+    def tick(self, (xt, yt), ground = None):
+        """ 'ground' is this opponent's distfromground(), when the scene has already batched it """
         self.move((xt, yt))
 
     def destroy(self):
@@ -135,16 +161,23 @@ class Ghost(Opponent):
 
     def draw(self, surface, camera):
         if self.ttl:
-            opprect = self.current_anim.draw(surface, self.rect.move((-camera[0], -camera[1])))
+            opprect = self.current_anim.draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
             return opprect
 
         drawx, drawy = self.x - camera[0], self.y - camera[1]
         if self.typing: color = Color.word_select
         else: color = Color.word_unselect
         wordrect = self.word.draw(surface, (drawx, drawy - 30), color)
-        opprect = self.current_anim.draw(surface, self.rect.move((-camera[0], -camera[1])))
+        opprect = self.current_anim.draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
         return wordrect.union(opprect)
 
+    def bounds(self):
+        anim = self.current_anim.frame_rect(self.rect)
+        if self.ttl:
+            return anim
+        word = self.word.bounds((self.x, self.y - 30))
+        return word and word.union(anim)
+
     def move(self, (xt, yt)):
         if self.ttl: # flee opponent when dead: this is the inverse of Opponent.move()
             xdist = xt - self.x
@@ -159,7 +192,7 @@ class Ghost(Opponent):
         else: # call basic opponent move
             Opponent.move(self, (xt, yt))
 
-    def tick(self, (xt, yt)):
+    def tick(self, (xt, yt), ground = None):
         self.current_anim.tick()
 
         if self.ttl is not None:
@@ -195,6 +228,8 @@ class Copter(Opponent):
     """ A flying enemy that is blocked by walls """
 
     name = "Copter"
+    placement = staticmethod(freeabove) # We may have spawned in a wall: move up until the hurting stops
+
     def __init__(self, word, (x, y), statics, speed = 2.5):
         super(Copter, self).__init__(word, (x, y), statics, speed)
         self.loadanims()
@@ -202,10 +237,6 @@ class Copter(Opponent):
         self.rect = self.current_anim.get_rect()
         self.rect.centerx, self.rect.bottom = (self.x, self.y)
         self.direction = 'l'
-        
-        while self.collision(): # We spawned in a wall!
-            self.rect.move_ip(0, -5) # move up until the hurting stops
-            self.y -= 5
 
     @classmethod
     def loadImages(cls):
@@ -223,20 +254,25 @@ class Copter(Opponent):
     def draw(self, surface, camera):
         if self.ttl:
             [explosion.tick() for explosion in self.anims['explosions']]
-            exprects = self.anims['explosions'].draw(surface, self.rect.move(-camera[0], -camera[1])) # Need to merge into one rect
+            exprects = self.anims['explosions'].draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1])) # Need to merge into one rect
             return exprects[0].unionall(exprects[1:])
         else:
             drawx, drawy = self.x - camera[0], self.y - camera[1]
             if self.typing: color = Color.word_select
             else: color = Color.word_unselect
             wordrect = self.word.draw(surface, (drawx, drawy - 40), color)
-            opprect = self.current_anim.draw(surface, self.rect.move((-camera[0], -camera[1])))
+            opprect = self.current_anim.draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
             return wordrect.union(opprect)
 
+    def bounds(self):
+        if self.ttl: # The explosions only move along while they're being drawn
+            return None
+        word = self.word.bounds((self.x, self.y - 40))
+        return word and word.union(self.current_anim.frame_rect(self.rect))
+
     def collision(self):
-        for static in self.statics:
-            if self.rect.colliderect(static.rect):
-                return True
+        if overlapping(self.rect, self.statics):
+            return True
 
     def move(self, (xt, yt)):
         if self.pause:
@@ -250,57 +286,53 @@ class Copter(Opponent):
         
         # Test whether the player is in view
         if self.direction == 'l':
-            clear = clearshot((self.rect.right, self.y), (xt, yt), [o.rect for o in self.statics])
+            clear = clearshot((self.rect.right, self.y), (xt, yt), self.statics)
         elif self.direction == 'r':
-            clear = clearshot((self.rect.left, self.y), (xt, yt), [o.rect for o in self.statics])
+            clear = clearshot((self.rect.left, self.y), (xt, yt), self.statics)
             
         if clear: # Probably within clear shot of player
-            collidex = False
+            dx, dy = 0, 0
             if not -2 < xdist < 2:
-                oldx = self.x
-                oldrect = self.rect
-                if xdist < 0:
-                    self.x -= nxdist * self.speed
-                else:
-                    self.x += nxdist * self.speed
-                self.rect.centerx, self.rect.bottom = (self.x, self.y)
-                if self.collision():
-                    self.x = oldx
-                    self.rect = oldrect
-                    collidex = True
+                dx = math.copysign(nxdist * self.speed, xdist)
             if not -2 < ydist < 2:
-                oldy = self.y
-                oldrect = self.rect
-                if collidex:
-                    # If we're trying to get through a wall, speed up movement in y direction
-                    nydist = 1 
-                if ydist < 0:
-                    self.y -= nydist * self.speed
-                else:
-                    self.y += nydist * self.speed
-                self.rect.centerx, self.rect.bottom = (self.x, self.y)
-                if self.collision():
-                    self.y = oldy
-                    self.rect = oldrect
+                dy = math.copysign(nydist * self.speed, ydist)
+
+            toi, normal, _ = sweep(self.rect, (dx, dy), self.statics)
+            self.slide(dx * toi, dy * toi)
+            if normal and normal[0] and dy:
+                # If we're trying to get through a wall, speed up movement in y direction
+                self.slide(0, math.copysign(self.speed, dy) * (1 - toi))
+            elif normal and normal[1] and dx:
+                self.slide(dx * (1 - toi), 0)
         else: # There be walls between us
             if yt < self.rect.top: multiplier = -1 # player above us
             else: multiplier = 1 # player below us
-                
-            realrect = self.rect
-            self.rect = self.rect.inflate(0, 40) # Hacky!
-            self.rect.move(0, multiplier * self.speed)
-            if not self.collision():
+
+            # Head toward the player vertically until a platform is in the way, then go around it
+            toi, normal, _ = sweep(self.rect, (0, multiplier * self.speed), self.statics)
+            if normal is None:
                 self.y += multiplier * self.speed
             else:
+                self.slide(0, multiplier * self.speed * toi)
                 if self.direction == 'l':
-                    self.x -= self.speed
+                    self.slide(-self.speed, 0)
                 elif self.direction == 'r':
-                    self.x += self.speed
-            self.rect = realrect
-                        
+                    self.slide(self.speed, 0)
+
         self.rect.centerx, self.rect.bottom = (self.x, self.y)
 
-    def tick(self, (xt, yt)):
+    def push(self, xdist, ydist):
+        self.slide(xdist, ydist) # Walls still stop us
+
+    def slide(self, dx, dy):
+        """ Move by (dx, dy), stopping short at the first static in the way """
+        if dx or dy:
+            toi, _, _ = sweep(self.rect, (dx, dy), self.statics)
+            self.x += dx * toi
+            self.y += dy * toi
+            self.rect.centerx, self.rect.bottom = (self.x, self.y)
+
+    def tick(self, (xt, yt), ground = None):
         self.current_anim.tick()
         if self.ttl is not None:
             self.ttl -= 1
@@ -320,20 +352,14 @@ class Copter(Opponent):
 class Commando(Opponent):
     name = "Commando"
     """ Sits still waiting for the player to arrive """
+    placement = staticmethod(groundbelow) # don't spawn him floating in the air
+
     def __init__(self, word, (x, y), statics = None, speed = 2.2):
         super(Commando, self).__init__(word, (x, y), statics, speed)
         self.loadanims()
         self.current_anim = self.idleleft
         self.rect = self.current_anim.get_rect()
         self.rect.centerx, self.rect.bottom = (self.x, self.y)
-        
-        if statics:
-            while distfromground(self.rect, self.statics) > 0: # don't spawn him floating in the air
-                if distfromground(self.rect, self.statics) == game_constants.big_distance:
-                    break
-                self.y += 1
-                self.rect.centerx, self.rect.bottom = (self.x, self.y)
-        
         self.direction = 'l'
         self.state = States.idle
 
@@ -353,11 +379,13 @@ class Commando(Opponent):
         elif self.direction == 'r':
             self.current_anim = self.idleright
     def draw(self, surface, camera):
-        opprect = self.current_anim.draw(surface, self.rect.move((-camera[0], -camera[1])))
+        opprect = self.current_anim.draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
         return opprect
+    def bounds(self):
+        return self.current_anim.frame_rect(self.rect)
     def move(self, (xt, yt)):
         pass
-    def tick(self, (xt, yt)):
+    def tick(self, (xt, yt), ground = None):
         self.current_anim.tick()
     def typeon(self, char):
         pass # Cleverly pretend we don't respond to typing
@@ -366,6 +394,7 @@ class Soldier(Opponent):
     """ Runs and jumps and falls around trying to find the player """
 
     name = "Soldier"
+    grounded = True
     def __init__(self, word, (x, y), statics, speed = 2.2):
         super(Soldier, self).__init__(word, (x, y), statics, speed)
         self.jumpspeed = 4.5
@@ -419,7 +448,7 @@ class Soldier(Opponent):
     def draw(self, surface, camera):
         if self.ttl:
             [explosion.tick() for explosion in self.anims['explosions']]
-            exprects = self.anims['explosions'].draw(surface, self.rect.move(-camera[0], -camera[1]))
+            exprects = self.anims['explosions'].draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
             # Need to merge into one rect
             return exprects[0].unionall(exprects[1:])
         else:
@@ -427,9 +456,15 @@ class Soldier(Opponent):
             if self.typing: color = Color.word_select
             else: color = Color.word_unselect
             wordrect = self.word.draw(surface, (drawx, drawy - self.rect.height - 30), color)
-            opprect = self.current_anim.draw(surface, self.rect.move((-camera[0], -camera[1])))
+            opprect = self.current_anim.draw(surface, (self.rect.x - camera[0], self.rect.y - camera[1]))
             return wordrect.union(opprect)
 
+    def bounds(self):
+        if self.ttl: # The explosions only move along while they're being drawn
+            return None
+        word = self.word.bounds((self.x, self.y - self.rect.height - 30))
+        return word and word.union(self.current_anim.frame_rect(self.rect))
+
     def move(self, (xt, yt)):
         if self.pause:
             self.pause -= 1
@@ -463,7 +498,7 @@ class Soldier(Opponent):
         self.rect = self.current_anim.get_rect()
         self.rect.centerx, self.rect.bottom = (self.x, self.y)
 
-    def tick(self, (xt, yt)):
+    def tick(self, (xt, yt), ground = None):
         self.current_anim.tick()
         if self.ttl is not None:
             self.ttl -= 1
@@ -471,7 +506,9 @@ class Soldier(Opponent):
                 self.kill()
                 return
 
-        dist = distfromground(self.rect, self.statics)
+        if ground is None:
+            ground = self.contacts.ground(self.rect, self.statics)
+        dist = ground
         if dist > 0:
             if dist > game_constants.jumpspeed: # Far from the ground
                 self.y += game_constants.jumpspeed
@@ -489,7 +526,7 @@ class Soldier(Opponent):
             jumped = False
             # FIXME: this is 80% correct, but maxjump_width/height are for the player,
             # and their math doesn't work out for soldier speed and bounding box.
-            for platform in self.statics:
+            for platform in overlapping(self.jumpwindow(), self.statics):
                 if self.y - game_constants.maxjump_height < platform.rect.top < self.y:
                     if self.direction == 'l':
                         if platform.rect.right < self.x:
@@ -513,10 +550,23 @@ class Soldier(Opponent):
         
         self.setanim()
 
+    def jumpwindow(self):
+        """ Where the tops of the platforms a jump would go for can be: up to maxjump_width ahead
+            and maxjump_height above, a couple of pixels bigger all round for the rounding
+        """
+        width, height = game_constants.maxjump_width, game_constants.maxjump_height
+        if self.direction == 'l':
+            left = self.x - width - 2
+        else:
+            left = self.x - 2
+        return pygame.rect.Rect(left, self.y - height - 2, width + 4, height + 4)
+
     def collision(self):
-        for static in self.statics:
-            if self.rect.colliderect(static.rect):
-                return True
+        if overlapping(self.rect, self.statics):
+            return True
+
+    def push(self, xdist, ydist):
+        self.x += xdist # Gravity decides where we end up vertically
 
     def jump(self):
         if self.state in (States.jumping, States.falling):
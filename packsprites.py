@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+""" Packs every frame in a data directory onto one sheet.
+
+    For each directory under data/ (or just the ones named on the command line) this writes
+    sheet.png with all the frames on it, and sheet.txt with a 'filename x y w h' line per frame.
+    loadframes reads frames off the sheet when there is one, so run this again after changing any art:
+
+    python packsprites.py [gunstar soldier ...]
+"""
+
+import os, sys
+import pygame
+
+sheet_width = 512
+padding = 1 # Keeps neighbouring frames apart when a GPU backend samples the sheet
+
+def sheetfiles(directory):
+    return os.path.join(directory, 'sheet.png'), os.path.join(directory, 'sheet.txt')
+
+def frames(directory):
+    names = sorted(name for name in os.listdir(directory)
+                   if name.endswith(('.png', '.gif')) and name != 'sheet.png')
+    return [(name, pygame.image.load(os.path.join(directory, name)).convert_alpha()) for name in names]
+
+def pack(images):
+    """ Shelf-pack (name, surface) pairs, tallest first; returns ({name: rect}, sheet height) """
+    rects = {}
+    x = y = row = 0
+    for name, image in sorted(images, key = lambda (name, image): (-image.get_height(), name)):
+        w, h = image.get_size()
+        if x + w > sheet_width:
+            x, y, row = 0, y + row + padding, 0
+        rects[name] = pygame.rect.Rect(x, y, w, h)
+        x += w + padding
+        row = max(row, h)
+    return rects, y + row
+
+def packdirectory(directory):
+    images = frames(directory)
+    rects, height = pack(images)
+
+    # Frames are copied on with MAX so their alpha lands on the sheet untouched
+    sheet = pygame.Surface((sheet_width, max(height, 1)), pygame.SRCALPHA, 32)
+    sheet.fill((0, 0, 0, 0))
+    for name, image in images:
+        sheet.blit(image, rects[name], special_flags = pygame.BLEND_RGBA_MAX)
+
+    image_path, manifest_path = sheetfiles(directory)
+    pygame.image.save(sheet, image_path)
+    manifest = open(manifest_path, 'w')
+    for name, image in images:
+        manifest.write('%s %d %d %d %d\n' % ((name,) + tuple(rects[name])))
+    manifest.close()
+    return len(images), sheet.get_size()
+
+def main(argv = sys.argv):
+    pygame.init()
+    pygame.display.set_mode((1, 1)) # convert_alpha needs a display
+
+    data = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    directories = argv[1:] or sorted(os.listdir(data))
+    for directory in directories:
+        count, size = packdirectory(os.path.join(data, directory))
+        print '%s: %d frames on a %dx%d sheet' % (directory, count, size[0], size[1])
+
+if __name__ == '__main__':
+    main()
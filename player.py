@@ -1,14 +1,21 @@
 import pygame, math, random
 from pygame.locals import *
-from general import Anim, game_constants, RenderUpdatesDraw, loadframes, flippedframes, n_of, WrappedSprite
-from collision import distfromground, distfromceiling
+from general import Anim, game_constants, RenderUpdatesDraw, loadframes, flippedframes, n_of, WrappedSprite, draw_line
+from collision import ContactCache, sweep, sweptrect
 
 class Weapons:
     """ Weapons will have different effects when typing """
-    normal, shotgun, bfg = range(3)
+    normal, shotgun, bfg, explosive, smartbomb = range(5)
     colors = ((0, 255, 0),
               (255, 0, 0),
-              (0, 0, 255))
+              (0, 0, 255),
+              (255, 140, 0),
+              (255, 255, 255))
+
+    # Area effects around an opponent when a shot finishes it off
+    knockback_radius   = 120 # shotgun: blast nearby opponents backwards...
+    knockback_distance = 40  # ...this far
+    blast_radius       = 90  # explosive: opponents this close go up too, and set off their neighbours
 
 class States:
     """ Enum for possible states that a Player object can be in """
@@ -55,9 +62,14 @@ class Bullet(pygame.sprite.Sprite):
         next_screenpos = self.next[0] - campos[0], self.next[1] - campos[1]
 
         # HACK: I think the 'inflate' is needed because the rect returned by 'draw' doesn't respect 'width'
-        self.rect = pygame.draw.line(surface, Weapons.colors[self.weapon], start_screenpos, next_screenpos, 2).inflate(2, 2)
+        self.rect = draw_line(surface, Weapons.colors[self.weapon], start_screenpos, next_screenpos, 2).inflate(2, 2)
         return self.rect
 
+    def bounds(self):
+        left, top = min(self.start[0], self.next[0]), min(self.start[1], self.next[1])
+        return pygame.rect.Rect(left, top, abs(self.start[0] - self.next[0]) + 1,
+                                abs(self.start[1] - self.next[1]) + 1).inflate(6, 6)
+
 class Player(WrappedSprite):
     """ Logic, graphics and methods for a game protagonist """
 
@@ -66,6 +78,8 @@ class Player(WrappedSprite):
 
         self.state = States.falling
         self.colliders = None
+        self.broadphase = None
+        self.contacts = ContactCache()
 
         self.loadanims()
         self.direction = 'r'
@@ -147,7 +161,7 @@ class Player(WrappedSprite):
             }
 
     def draw(self, surface, campos):
-        return self.current_anim.draw(surface, self.rect.move((-campos[0], -campos[1])))
+        return self.current_anim.draw(surface, (self.rect.x - campos[0], self.rect.y - campos[1]))
 
     def setanim(self): # Set animation from state and direction
         if self.state != States.shooting:
@@ -158,8 +172,13 @@ class Player(WrappedSprite):
         self.rect.bottom = int(self.position[1])
         self.rect.centerx = int(self.position[0])
 
-    def collide(self):
-        return pygame.sprite.spritecollide(self, self.colliders, False)
+    def collide(self, rect = None):
+        """ Statics overlapping 'rect', which defaults to the player's own rect """
+        if rect is None:
+            rect = self.rect
+        if self.broadphase:
+            return self.broadphase.query(rect, 'statics')
+        return [collider for collider in self.colliders if collider.rect.colliderect(rect)]
 
     def direct(self, direction):
         self.moving = True
@@ -182,7 +201,7 @@ class Player(WrappedSprite):
         # If we're falling, check how far we are from the nearest ground. If we're further than one tick's distance,
         # move jumpspeed units. If we're closer than one tick's distance, move directly to the ground.
         if self.state in (States.falling, States.hit):
-            dist = distfromground(self.rect, self.colliders)
+            dist = self.contacts.ground(self.rect, self.colliders)
             if dist <= abs(self.velocity):
                 self.move_vertical(dist)
                 if self.state == States.hit:
@@ -194,7 +213,7 @@ class Player(WrappedSprite):
             else:
                 self.move_vertical(-self.velocity)
         elif self.state == States.jumping:
-            dist = distfromceiling(self.rect, self.colliders)
+            dist = self.contacts.ceiling(self.rect, self.colliders)
             if dist <= self.velocity:
                 self.move_vertical(-dist)
                 self.state = States.falling
@@ -204,7 +223,7 @@ class Player(WrappedSprite):
             if self.velocity <= 0 or self.collide():
                 self.state = States.falling
         elif self.state == States.running:
-            newdist = distfromground(self.rect, self.colliders)
+            newdist = self.contacts.ground(self.rect, self.colliders)
             if newdist > 0:
                 self.state = States.falling
             if not self.moving: self.state = States.idle # Not moving but run animation is being displayed
@@ -226,13 +245,13 @@ class Player(WrappedSprite):
                         jump_slow = True
 
             if self.state in (States.running, States.jumping, States.falling) and not jump_slow: # Left-Right movement is allowed
-                oldpos, oldrect = self.position, self.rect
                 if self.direction == 'l':
-                    self.move_horizontal(-game_constants.speed)
+                    dx = -game_constants.speed
                 elif self.direction == 'r':
-                    self.move_horizontal(game_constants.speed)
-                if self.collide():
-                    self.position, self.rect = oldpos, oldrect
+                    dx = game_constants.speed
+                # Stop flush against whatever is in the way instead of moving and backing out
+                toi, _, _ = sweep(self.rect, (dx, 0), self.collide(sweptrect(self.rect, (dx, 0))))
+                self.move_horizontal(dx * toi)
 
         self.setanim()
         self.current_anim.tick()
@@ -245,14 +264,13 @@ class Player(WrappedSprite):
 
         self.moving = False # Require the move() function to refresh this every tick
 
-    # fixme: these are dumb
     def move_vertical(self, vdist):
         self.position = self.position[0], self.position[1] + vdist
-        self.rect.move(0, vdist)
+        self.rect.bottom = int(self.position[1])
 
     def move_horizontal(self, hdist):
         self.position = self.position[0] + hdist, self.position[1]
-        self.rect.move(hdist, 0)
+        self.rect.centerx = int(self.position[0])
 
     def idle(self):
         self.state = States.idle
@@ -328,10 +346,10 @@ class Player(WrappedSprite):
             if self.shots_left < 0:
                 self.weapon = Weapons.normal
 
-        if self.weapon == Weapons.normal:
-            shotcount = 1
-        elif self.weapon == Weapons.shotgun:
+        if self.weapon == Weapons.shotgun:
             shotcount = 3
+        else:
+            shotcount = 1
 
         for _ in xrange(shotcount):
             # Fudge the destination point a bit to make it look like shots are being
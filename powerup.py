@@ -1,37 +1,34 @@
 import pygame, general
-from collision import distfromground
-from general import game_constants, loadframes
+from general import loadframes
 from player import Weapons
 
 class Powerup(general.WrappedSprite):
-    """ A non-moving object that sits on a platform waiting to be consumed. """
+    """ A non-moving object that sits on a platform waiting to be consumed.
+        'position' is where its bottom center goes: on the ground, which whoever drops it finds.
+    """
 
-    def __init__(self, position, statics):
+    def __init__(self, position):
         super(Powerup, self).__init__()
 
         self.x, self.y = position
         self.rect      = pygame.rect.Rect(0, 0, 0, 0)
-        self.statics   = statics
         self.rect.centerx, self.rect.bottom = position
 
-        while distfromground(self.rect, self.statics) > 0:
-            # Ensure this thing is on the ground
-            self.y += 1
-            self.rect.bottom = self.y
-            if distfromground(self.rect, self.statics) == game_constants.big_distance:
-                # fallen off the screen
-                self.kill()
-                break
-
         self.image = None # needs to be overloaded by other classes
         self.loadanims()
       
     def draw(self, surface, campos):
-        return self.image.draw(surface, self.rect.move((-campos[0], -campos[1])))
+        return self.image.draw(surface, (self.rect.x - campos[0], self.rect.y - campos[1]))
+
+    def bounds(self):
+        return self.image.frame_rect(self.rect)
 
     def loadanims(self):
         pass
 
+    def collision_mask(self):
+        return self.animmask(self.image)
+
     def effect(self, player):
         pass
 
@@ -67,3 +64,48 @@ class Heart(Powerup):
 
     def effect(self, scene, player):
         scene.health.increase()
+
+def bombframes(color):
+    """ Two frames of a round bomb in the weapon's bullet colour, its fuse sparking. There's no art for the
+        bombs in data/, and the explosion frames would look like the powerup going off
+    """
+    frames = []
+    for spark in ((255, 255, 0), (255, 90, 0)):
+        frame = pygame.Surface((20, 24), pygame.SRCALPHA, 32)
+        pygame.draw.line(frame, (120, 90, 40), (12, 9), (15, 3), 2)
+        pygame.draw.circle(frame, spark, (15, 3), 3)
+        pygame.draw.circle(frame, (0, 0, 0), (9, 15), 9)
+        pygame.draw.circle(frame, color, (9, 15), 7)
+        pygame.draw.circle(frame, (255, 255, 255), (6, 12), 2)
+        frames.append(frame.convert_alpha())
+    return frames
+
+class Bomb(Powerup):
+    @classmethod
+    def loadImages(cls):
+        super(Bomb, cls).loadImages()
+        cls.images['bomb'] = bombframes(Weapons.colors[Weapons.explosive])
+
+    def loadanims(self):
+        self.image = general.Anim(self.images['bomb'], (10, 10))
+        self.rect = self.image.get_rect()
+        self.rect.centerx, self.rect.bottom = self.x, self.y
+
+    def effect(self, scene, player):
+        player.weapon = Weapons.explosive
+        player.shots_left = 10
+
+class SmartBomb(Powerup):
+    @classmethod
+    def loadImages(cls):
+        super(SmartBomb, cls).loadImages()
+        cls.images['smartbomb'] = bombframes(Weapons.colors[Weapons.smartbomb])
+
+    def loadanims(self):
+        self.image = general.Anim(self.images['smartbomb'], (10, 10))
+        self.rect = self.image.get_rect()
+        self.rect.centerx, self.rect.bottom = self.x, self.y
+
+    def effect(self, scene, player):
+        player.weapon = Weapons.smartbomb
+        player.shots_left = 20 # Used up by the first kill, if that comes sooner
@@ -1,8 +1,10 @@
-import pygame, random, general
+import pygame, random, math, general
 from pygame.locals import *
 from controller import Controller
-from general import game_constants, loadframes, GetFont, Color, RenderUpdatesDraw, Score, Word
-from player import Player
+from general import game_constants, loadframes, GetFont, Color, RenderUpdatesDraw, DirtyRegions, Score, Word
+from player import Player, States
+from collision import IndexedGroup, PointIndex, SweepAndPrune, distsfromground
+from glrender import GLCanvas
 from opponents import Soldier, Copter, Ghost, Commando
 
 class SpecialChars:
@@ -43,16 +45,9 @@ class Health:
         self.rect = pygame.rect.Rect((0, 0), (0, 0))
         self.max_hearts = max_hearts
         self.current_hearts = max_hearts
-        self.redraw = True
-
-    def clear(self, screen, background):
-        if self.redraw:
-            screen.blit(background, self.rect)
+        self.redraw = True # Hearts changed since they were last drawn
 
     def draw(self, screen):
-        if not self.redraw:
-            return []
-
         lastx = 5
         dirty = []
         for _ in xrange(self.fullHearts()):
@@ -93,6 +88,42 @@ class Health:
     def value(self):
         return self.current_hearts
 
+class Hud:
+    """ The header with the score and hearts on it, kept composed on its own surface. It's only put
+        together again, and only reported dirty, when the score or hearts have something new to show.
+    """
+
+    def __init__(self, header, score, health):
+        self.header = header
+        self.score = score
+        self.health = health
+        self.surface = None
+        self.shown = False # Whether the screen has the current surface on it
+
+        self.recomposes = 0
+
+    def update(self, elapsed):
+        self.score.tick(elapsed)
+        if self.surface is None or self.score.changed or self.health.redraw:
+            self.compose()
+
+    def compose(self):
+        # A new surface rather than drawing over the old one, for displays that hold on to textures
+        self.surface = self.header.copy()
+        self.score.draw(self.surface)
+        self.health.draw(self.surface)
+        self.score.changed = False
+        self.shown = False
+        self.recomposes += 1
+
+    def draw(self, screen, elapsed):
+        """ Dirty rects: the header, if it changed """
+        self.update(elapsed)
+        if self.shown:
+            return []
+        self.shown = True
+        return [screen.blit(self.surface, (0, 0))]
+
 class Platform(general.Box):
     """ A Box with a bunch of collision rules used in the game """
 
@@ -105,23 +136,31 @@ class Platform(general.Box):
         self.font = GetFont(16)
 
     def draw(self, surface, campos):
-        box =  super(Platform, self).draw(surface, campos)
+        box = super(Platform, self).draw(surface, campos)
+        label = self.draw_overlay(surface, campos)
+        if label is None:
+            return box
+        return box.union(label)
+
+    def draw_overlay(self, surface, campos):
+        """ The platform's word, on both ends """
+        if not self.word:
+            return None
 
         # It feels like maybe this label code should go elsewhere
-        if self.word:
-            if self.selected: color = Color.platform_selected
-            elif self.reachable: color = Color.platform_reachable
-            else: color = Color.platform_unreachable
-            left = self.word.draw(
-                surface,
-                (self.rect.left - campos[0] + 10, self.rect[1] - campos[1] + 5),
-                color)
-            right = self.word.draw(
-                surface,
-                (self.rect.right - campos[0] - 10, self.rect[1] - campos[1] + 5),
-                color)
-
-        return box.union(left.union(right)) # HACK
+        if self.selected: color = Color.platform_selected
+        elif self.reachable: color = Color.platform_reachable
+        else: color = Color.platform_unreachable
+        left = self.word.draw(
+            surface,
+            (self.rect.left - campos[0] + 10, self.rect[1] - campos[1] + 5),
+            color)
+        right = self.word.draw(
+            surface,
+            (self.rect.right - campos[0] - 10, self.rect[1] - campos[1] + 5),
+            color)
+
+        return left.union(right) # HACK
 
     def contents(self):
         return self.word.string
@@ -129,11 +168,170 @@ class Platform(general.Box):
     def setword(self, text):
         if not self.word: self.word = Word(text, self.font)
 
+class OverlayDraw(RenderUpdatesDraw):
+    """ Statics that are already painted on a StaticLayer: only what goes on top of them gets drawn """
+
+    def draw_sprite(self, sprite, surface, campos):
+        return sprite.draw_overlay(surface, campos)
+
+class Scenery(object):
+    """ A ridge of hills across the screen, between 'top' and 'top' + 'height', that scrolls sideways
+        at 'rate' times the camera's speed for a bit of depth. The ridge is pre-rendered onto a tile that
+        wraps around every 'period' pixels, so any part of it can be drawn in a blit or two. Behind it
+        on the tile is whatever 'background' has in those rows when the scenery is made, which has to
+        look the same all the way across. Below the ridge is left to the background: the scene fills
+        it in solid, after making this scenery and before making any in front of it.
+    """
+
+    def __init__(self, background, color, top, height, rate, seed, period = 1024):
+        self.rect = pygame.rect.Rect(0, top, background.get_width(), height)
+        self.rate = rate
+        self.period = period
+
+        self.tile = pygame.Surface((period, height)).convert(background)
+        for x in xrange(0, period, self.rect.width):
+            self.tile.blit(background, (x, 0), self.rect)
+        self.draw_ridge(color, random.Random(seed))
+
+    def draw_ridge(self, color, rand):
+        """ Fill the tile in under a skyline made of a few sine waves that all fit 'period' evenly, so it wraps """
+        height = self.rect.height
+        waves = [(rand.randint(1, 3) * cycles, rand.uniform(0, 2 * math.pi), rand.uniform(.1, .25))
+                 for cycles in (1, 3, 7)]
+        points = [(0, height)]
+        for x in xrange(0, self.period + 1, 8):
+            crest = sum(amplitude * math.sin(2 * math.pi * cycles * x / self.period + phase)
+                        for cycles, phase, amplitude in waves)
+            points.append((x, int(height * (.5 - crest))))
+        points.append((self.period, height))
+        pygame.draw.polygon(self.tile, color, points)
+
+    def offset(self, camera_left):
+        """ How far the scenery has scrolled when the camera is at 'camera_left' """
+        return int(math.floor(camera_left * self.rate))
+
+    def draw(self, surface, camera_left, area = None):
+        """ Blit the part of the scenery in 'area' (on the screen; all of it by default) """
+        area = self.rect if area is None else self.rect.clip(area)
+        x = area.left
+        tx = (x + self.offset(camera_left)) % self.period
+        while x < area.right:
+            width = min(self.period - tx, area.right - x)
+            surface.blit(self.tile, (x, area.top), (tx, area.top - self.rect.top, width, area.height))
+            x += width
+            tx = 0
+
+class StaticLayer(object):
+    """ The scene's background with every platform's tiles already drawn on it, as seen from the camera.
+        When the camera moves sideways the layer is scrolled and only the strip that came into view
+        gets painted. Scenery bands (which mustn't overlap) scroll at their own speed, so in them
+        the platforms are painted again too, along with the strip of scenery that came into view.
+        The background gradient is fixed to the screen, so moving up or down repaints it all.
+    """
+
+    def __init__(self, background, statics, scenery = ()):
+        self.background = background
+        self.statics = statics
+        self.scenery = sorted(scenery, key = lambda scenery: scenery.rect.top)
+        self.surface = background.copy()
+        self.camera = None
+        self.changed = []  # Areas of the layer that differ from what was last shown
+
+        self.scrolls = 0
+        self.repaints = 0
+
+    def follow(self, camera):
+        """ Bring the layer up to date with 'camera'; returns the areas that changed """
+        area = self.surface.get_rect()
+        if self.camera is None or camera.top != self.camera.top or abs(camera.left - self.camera.left) >= area.width:
+            self.paint(area, camera)
+            self.changed = [area]
+            self.repaints += 1
+        elif camera.left != self.camera.left:
+            dx = camera.left - self.camera.left
+            top = 0
+            for scenery in self.scenery:
+                self.scroll(pygame.rect.Rect(0, top, area.width, scenery.rect.top - top), dx)
+                self.scroll_scenery(scenery, camera)
+                top = scenery.rect.bottom
+            self.scroll(pygame.rect.Rect(0, top, area.width, area.height - top), dx)
+            self.paint(self.exposed(area, dx), camera)
+            self.changed = [area]
+            self.scrolls += 1
+        self.camera = pygame.rect.Rect(camera)
+
+        changed, self.changed = self.changed, []
+        return changed
+
+    def scroll(self, rows, dx):
+        if rows.height > 0:
+            self.surface.set_clip(rows)
+            self.surface.scroll(-dx, 0)
+            self.surface.set_clip(None)
+
+    def exposed(self, rows, dx):
+        """ The strip of 'rows' that scrolling by 'dx' leaves to be painted """
+        if dx > 0:
+            return pygame.rect.Rect(rows.right - dx, rows.top, dx, rows.height)
+        return pygame.rect.Rect(rows.left, rows.top, -dx, rows.height)
+
+    def scroll_scenery(self, scenery, camera):
+        """ Scroll a scenery band by as much as the scenery moved, then paint its new strip and
+            the platforms in it, which moved by a different amount, where they were and where they are
+        """
+        band = scenery.rect
+        dx = scenery.offset(camera.left) - scenery.offset(self.camera.left)
+        self.scroll(band, dx)
+        areas = [self.exposed(band, dx)]
+        for static in self.statics.index.query(band.move(self.camera.topleft)):
+            areas.append(static.rect.move(-self.camera.left - dx, -self.camera.top))
+        for static in self.statics.index.query(band.move(camera.topleft)):
+            areas.append(static.rect.move(-camera.left, -camera.top))
+        for area in areas:
+            area = area.clip(band)
+            if area.width and area.height:
+                self.paint(area, camera)
+
+    def invalidate(self, rect):
+        """ A static has come or gone from world area 'rect' """
+        if self.camera is None:
+            return
+        area = rect.move(-self.camera.left, -self.camera.top).clip(self.surface.get_rect())
+        if area.width and area.height:
+            self.paint(area, self.camera)
+            self.changed.append(area)
+
+    def paint(self, area, camera):
+        self.surface.set_clip(area)
+        # Scenery goes straight on where it covers, the background everywhere else
+        top = area.top
+        for scenery in self.scenery:
+            band = scenery.rect.clip(area)
+            if not band.height:
+                continue
+            if band.top > top:
+                self.surface.blit(self.background, (area.left, top), (area.left, top, area.width, band.top - top))
+            scenery.draw(self.surface, camera.left, band)
+            top = band.bottom
+        if top < area.bottom:
+            self.surface.blit(self.background, (area.left, top), (area.left, top, area.width, area.bottom - top))
+        for static in self.statics.index.query(area.move(camera.topleft)):
+            general.Box.draw(static, self.surface, camera.topleft)
+        self.surface.set_clip(None)
+
 class BaseScene(object):
+    """ Scenes that only draw when something happens (see lazy_redraw). The default draw() paints
+        self.widgets: all of them the first time, and after that only what changed on each of them.
+    """
+
+    background = Color.DARK_GRAY
+
     def __init__(self, screen):
         self.screen = screen
         self.dirty = True
         self.switch_to = None
+        self.widgets = []
+        self.painted = False # Whether the screen still has everything from the last draw on it
 
     def handleKeyup(self, key):
         pass
@@ -144,37 +342,102 @@ class BaseScene(object):
     def switchToScene(self):
         return self.switch_to
 
-class LoadingScene(BaseScene):
     def draw(self):
-        self.screen.fill((0, 0, 0))
-        message = GetFont(72).render("Loading...", 1, Color.MOSTLY_WHITE)
-        self.screen.blit(
-            message,
-            message.get_rect(
-                centerx = self.screen.get_width() / 2,
-                centery = self.screen.get_height() * .25))
-        pygame.display.update()
-
+        # Only real surfaces keep what was drawn on them from one draw to the next
+        if self.painted and isinstance(self.screen, pygame.Surface):
+            rects = []
+            for widget in self.widgets:
+                rects += widget.repaint(self.screen, self.background)
+            general.present(self.screen, rects)
+        else:
+            self.screen.fill(self.background)
+            for widget in self.widgets:
+                widget.draw(self.screen)
+            general.present(self.screen)
+            self.painted = True
         self.dirty = False
 
+class Still:
+    """ An image that's drawn once and never changes """
+
+    def __init__(self, image, **position):
+        self.image = image
+        self.rect = image.get_rect(**position)
+
+    def draw(self, screen):
+        return screen.blit(self.image, self.rect)
+
+    def repaint(self, screen, background):
+        return []
+
+class Label(Still):
+    """ A line of text, rendered once """
+
+    def __init__(self, text, size, color = Color.MOSTLY_WHITE, **position):
+        Still.__init__(self, GetFont(size).render(text, 1, color), **position)
+
+class Menu:
+    """ Choices in a column down the middle of the screen, the one under the cursor in yellow.
+        Each row is rendered both ways up front, so moving the cursor only repaints the row it
+        left and the row it landed on.
+    """
+
+    def __init__(self, choices, top, size = 24):
+        self.choices = choices
+        self.selected = 0
+        self.rows = [] # (normal, highlighted, rect)
+        for choice in choices:
+            normal = GetFont(size).render(choice.upper(), 1, Color.MOSTLY_WHITE)
+            highlighted = GetFont(size).render(choice.upper(), 1, Color.YELLOW)
+            rect = normal.get_rect(centerx = game_constants.w / 2, top = top)
+            self.rows.append((normal, highlighted, rect))
+            top += rect.height
+        self.changed = []
+
+    def move(self, step):
+        """ Move the cursor 'step' rows down (up if negative); whether it moved """
+        selected = min(max(self.selected + step, 0), len(self.choices) - 1)
+        if selected == self.selected:
+            return False
+        self.changed += [self.selected, selected]
+        self.selected = selected
+        return True
+
+    def choice(self):
+        return self.choices[self.selected]
+
+    def draw_row(self, screen, i):
+        normal, highlighted, rect = self.rows[i]
+        return screen.blit(highlighted if i == self.selected else normal, rect)
+
+    def draw(self, screen):
+        self.changed = []
+        return [self.draw_row(screen, i) for i in xrange(len(self.rows))]
+
+    def repaint(self, screen, background):
+        rects = []
+        for i in set(self.changed):
+            screen.fill(background, self.rows[i][2])
+            rects.append(self.draw_row(screen, i))
+        self.changed = []
+        return rects
+
+class LoadingScene(BaseScene):
+    background = Color.BLACK
+
+    def __init__(self, screen):
+        super(LoadingScene, self).__init__(screen)
+        self.widgets = [Label("Loading...", 72, centerx = screen.get_width() / 2, centery = screen.get_height() * .25)]
+
 class GameOverScene(BaseScene):
-    def draw(self):
-        self.screen.fill(Color.BLACK)
-        message = GetFont(72).render("GAME OVER", 1, Color.MOSTLY_WHITE)
-        instr = GetFont(32).render("Return to restart, Esc to quit.", 1, Color.MOSTLY_WHITE)
-        self.screen.blit(
-            message,
-            message.get_rect(
-                centerx = self.screen.get_width() / 2,
-                centery = self.screen.get_height() * .25))
-        self.screen.blit(
-            instr,
-            instr.get_rect(
-                centerx = self.screen.get_width() / 2,
-                centery = self.screen.get_height() * .75))
-        pygame.display.update()
+    background = Color.BLACK
 
-        self.dirty = False
+    def __init__(self, screen):
+        super(GameOverScene, self).__init__(screen)
+        self.widgets = [
+            Label("GAME OVER", 72, centerx = screen.get_width() / 2, centery = screen.get_height() * .25),
+            Label("Return to restart, Esc to quit.", 32, centerx = screen.get_width() / 2, centery = screen.get_height() * .75),
+        ]
 
     def handleKeydown(self, event_key):
         if event_key == K_RETURN:
@@ -183,42 +446,18 @@ class GameOverScene(BaseScene):
 class TitleScene(BaseScene):
     def __init__(self, screen):
         super(TitleScene, self).__init__(screen)
-        self.options_order = ['play', 'instructions', 'options']
-        self.selected_option = 0
-
-    def draw(self):
-        self.screen.fill(Color.DARK_GRAY)
-        title = GetFont(50).render("TYPER COMBAT", 1, Color.MOSTLY_WHITE)
-        title_rect = title.get_rect(centerx = game_constants.w / 2, top = 0)
-        self.screen.blit(title, title_rect)
-
-        options_texts = []
-        for i, option_str in enumerate(self.options_order):
-            color = Color.MOSTLY_WHITE
-            if (i == self.selected_option):
-                color = Color.YELLOW
-            options_texts.append(GetFont(24).render(option_str.upper(), 1, color))
-
-        draw_h = game_constants.h / 2
-        for option in options_texts:
-            rect = option.get_rect(centerx = game_constants.w / 2, top = draw_h)
-            self.screen.blit(option, rect)
-            draw_h += rect.height
-
-        pygame.display.update()
-        self.dirty = False
+        self.menu = Menu(['play', 'instructions', 'options'], game_constants.h / 2)
+        self.widgets = [Label("TYPER COMBAT", 50, centerx = game_constants.w / 2, top = 0), self.menu]
 
     def handleKeydown(self, event_key):
         if event_key == K_UP:
-            self.selected_option = max(self.selected_option - 1, 0)
-            self.dirty = True
+            self.dirty = self.menu.move(-1)
 
         if event_key == K_DOWN:
-            self.selected_option = min(self.selected_option + 1, len(self.options_order))
-            self.dirty = True
+            self.dirty = self.menu.move(1)
 
         if event_key == K_RETURN:
-            selected_op = self.options_order[self.selected_option]
+            selected_op = self.menu.choice()
             if (selected_op == 'play'):
                 self.switch_to = Controller(self.screen)
             if (selected_op == 'instructions'):
@@ -230,49 +469,28 @@ class TitleScene(BaseScene):
             self.switch_to = DebugScene(self.screen)
 
 class DebugScene(BaseScene):
+    challenge = ("the commando will not let you pass until every word of this is typed out, "
+                 "so take it steady, a paragraph is long, but one wrong key costs nothing more "
+                 "than the time it takes to find the right one again")
+
     def __init__(self, screen):
         super(DebugScene, self).__init__(screen)
-
-        self.options_order = ['single word', 'back']
-        self.selected_option = 0
-
-    def draw(self):
-        self.screen.fill(Color.DARK_GRAY)
-
-        text_line = GetFont(32).render("Debugging Options", 1, Color.MOSTLY_WHITE)
-        text_line_rect = text_line.get_rect(centerx = game_constants.w / 2, top = 20)
-
-        options_texts = []
-        for i, option_str in enumerate(self.options_order):
-            color = Color.MOSTLY_WHITE
-            if (i == self.selected_option):
-                color = Color.YELLOW
-            options_texts.append(GetFont(24).render(option_str.upper(), 1, color))
-
-        draw_h = game_constants.h / 2
-        for option in options_texts:
-            rect = option.get_rect(centerx = game_constants.w / 2, top = draw_h)
-            self.screen.blit(option, rect)
-            draw_h += rect.height
-
-        self.screen.blit(text_line, text_line_rect)
-
-        pygame.display.update()
-        self.dirty = False
+        self.menu = Menu(['single word', 'typing challenge', 'back'], game_constants.h / 2)
+        self.widgets = [self.menu, Label("Debugging Options", 32, centerx = game_constants.w / 2, top = 20)]
 
     def handleKeydown(self, event_key):
         if event_key == K_UP:
-            self.selected_option = max(self.selected_option - 1, 0)
-            self.dirty = True
+            self.dirty = self.menu.move(-1)
 
         if event_key == K_DOWN:
-            self.selected_option = min(self.selected_option + 1, len(self.options_order))
-            self.dirty = True
+            self.dirty = self.menu.move(1)
 
         if event_key == K_RETURN:
-            selected_op = self.options_order[self.selected_option]
+            selected_op = self.menu.choice()
             if (selected_op == 'single word'):
                 self.switch_to = SingleWordDebugScene(self.screen)
+            if (selected_op == 'typing challenge'):
+                self.switch_to = ChallengeScene(self.screen, Word(self.challenge), DebugScene(self.screen))
             if (selected_op == 'back'):
                 self.switch_to = TitleScene(self.screen)
 
@@ -291,7 +509,7 @@ class SingleWordDebugScene(BaseScene):
         drawx, drawy = game_constants.w / 2, game_constants.h / 2
         wordrect = self.word.draw(self.screen, (drawx, drawy - 10), Color.text_normal)
 
-        pygame.display.update()
+        general.present(self.screen)
         self.dirty = False
 
     def handleKeydown(self, event_key):
@@ -313,9 +531,6 @@ class InstructionsScene(BaseScene):
         self.chopper = loadframes('copter',  ('fly1.gif',))[0]
         self.ghost   = loadframes('ghost',   ('right1.gif',))[0]
 
-    def draw(self):
-        self.screen.fill(Color.DARK_GRAY)
-
         enemies = [
             (self.soldier, "SOLDIERS are constrained by the laws of gravity."),
             (self.chopper, "COPTERS can fly, but won't go through platforms."),
@@ -330,88 +545,93 @@ Press return to continue."""
 
         last_y = game_constants.h
         for text in reversed(instructions_text.split("\n")):
-            rendered_text = GetFont(16).render(text, 1, Color.MOSTLY_WHITE)
-
-            cur_y = last_y - rendered_text.get_height()
-            self.screen.blit(
-                rendered_text,
-                rendered_text.get_rect(centerx = game_constants.w / 2, centery = cur_y))
+            label = Label(text, 16)
+            cur_y = last_y - label.rect.height
+            label.rect.center = (game_constants.w / 2, cur_y)
+            self.widgets.append(label)
             last_y = cur_y
 
         for image, text in reversed(enemies):
-            rendered_text = GetFont(16).render(text, 1, Color.MOSTLY_WHITE)
-
-            cur_y = last_y - rendered_text.get_height() - 20
-            rect = rendered_text.get_rect(centerx = game_constants.w / 2, centery = cur_y)
-            self.screen.blit(rendered_text, rect)
-            self.screen.blit(
-                image,
-                image.get_rect(centerx = rect.left - image.get_width() - 10, centery = cur_y))
+            label = Label(text, 16)
+            cur_y = last_y - label.rect.height - 20
+            label.rect.center = (game_constants.w / 2, cur_y)
+            self.widgets.append(label)
+            self.widgets.append(Still(image, centerx = label.rect.left - image.get_width() - 10, centery = cur_y))
             last_y = cur_y
 
         gunstar_top = last_y / 2 - self.image.get_height() / 2
-        self.screen.blit(
-            self.image,
-            self.image.get_rect(centerx = game_constants.w / 2, top = gunstar_top))
-
-        pygame.display.update()
-        self.dirty = False
+        self.widgets.append(Still(self.image, centerx = game_constants.w / 2, top = gunstar_top))
 
     def handleKeydown(self, event_key):
         if event_key == K_RETURN:
             self.switch_to = TitleScene(self.screen)
 
 class Option:
-    def __init__(self, screen, value, checked = False, active = False):
-        self.screen = screen
+    """ A checkbox with its label; the label is rendered once and only the box is ever repainted """
+
+    def __init__(self, value, checked = False, active = False):
         self.checked = checked
         self.active = active
         self.value = value
+        self.label = GetFont(16).render(self.value, 1, Color.MOSTLY_WHITE)
+        self.place((0, 0))
+        self.changed = True
+
+    def place(self, (x, y)):
+        self.box = Rect(x, y, 25, 25)
+        self.label_rect = self.label.get_rect(left = x + 30, top = y)
 
     def toggle(self):
         self.checked = not self.checked
+        self.changed = True
 
     def is_checked(self):
         return self.checked
 
     def activate(self):
+        self.changed = self.changed or not self.active
         self.active = True
 
     def deactivate(self):
+        self.changed = self.changed or self.active
         self.active = False
 
-    def draw(self, (x, y)):
-        text_line = GetFont(16).render(self.value, 1, Color.MOSTLY_WHITE)
-        text_line_rect = text_line.get_rect(left = x + 30, top = y)
-        self.screen.blit(text_line, text_line_rect)
+    def draw(self, screen):
+        return screen.blit(self.label, self.label_rect).union(self.draw_box(screen))
 
-        outer_rect = Rect(x, y, 25, 25)
+    def draw_box(self, screen):
+        outer_rect = self.box
         inner_rect = outer_rect.inflate(-8, -8)
 
         if self.checked:
             if self.active:
                 # Selected with cursor: box with box in it
-                pygame.draw.rect(self.screen, Color.LIGHT_GRAY, outer_rect, 0)
-                pygame.draw.rect(self.screen, Color.GRAY, inner_rect, 0)
+                screen.fill(Color.LIGHT_GRAY, outer_rect)
+                screen.fill(Color.GRAY, inner_rect)
             else:
                 # Selected without cursor: tiny box
-                pygame.draw.rect(self.screen, Color.BLACK, outer_rect, 0)
-                pygame.draw.rect(self.screen, Color.GRAY, inner_rect, 0)
+                screen.fill(Color.BLACK, outer_rect)
+                screen.fill(Color.GRAY, inner_rect)
         else:
             if self.active:
                 # Unselected with cursor: empty box
-                pygame.draw.rect(self.screen, Color.LIGHT_GRAY, outer_rect, 0)
-                pygame.draw.rect(self.screen, Color.BLACK, inner_rect, 0)
+                screen.fill(Color.LIGHT_GRAY, outer_rect)
+                screen.fill(Color.BLACK, inner_rect)
             else:
                 # Unselected without cursor: blank
-                pygame.draw.rect(self.screen, Color.DARK_GRAY, outer_rect, 0)
+                screen.fill(Color.DARK_GRAY, outer_rect)
+
+        self.changed = False
+        return outer_rect
 
 class OptionGroup:
     def __init__(self, (x, y), options = []):
-        self.options = options
+        self.options = []
         self.x = x
         self.y = y
         self.selected = 0
+        for option in options:
+            self.add(option)
 
     def up(self):
         if self.selected > 0:
@@ -435,11 +655,14 @@ class OptionGroup:
         self.options[self.selected].deactivate()
 
     def add(self, option):
+        option.place((self.x, self.y + 25 * len(self.options)))
         self.options.append(option)
 
-    def draw(self):
-        for i, option in enumerate(self.options):
-            option.draw((self.x, self.y + 25 * i))
+    def draw(self, screen):
+        return [option.draw(screen) for option in self.options]
+
+    def repaint(self, screen, background):
+        return [option.draw_box(screen) for option in self.options if option.changed]
 
     def get_checked(self):
         return [opt for opt in self.options if opt.is_checked()]
@@ -456,32 +679,22 @@ class OptionsScene(BaseScene):
 
         self.feeds_group = OptionGroup(
             (100, 100),
-            [Option(self.screen, word) for word in self.word_sources])
+            [Option(word) for word in self.word_sources])
         self.enemy_group = OptionGroup(
             (300, 100),
-            [Option(self.screen, x.name) for x in self.enemy_types])
+            [Option(x.name) for x in self.enemy_types])
 
         self.option_groups = [self.feeds_group, self.enemy_group]
         self.feeds_group.activate()
 
         self.groupnum = 0
 
-    def draw(self):
-        self.screen.fill(Color.DARK_GRAY)
-
-        text_line = GetFont(32).render("INTENSE OPTIONS SCREEN", 1, Color.MOSTLY_WHITE)
-        text_line_rect = text_line.get_rect(centerx = game_constants.w / 2, top = 20)
-
-        self.screen.blit(text_line, text_line_rect)
-
-        [group.draw() for group in self.option_groups]
-
-        text_line = GetFont(16).render("(Space to select, return to continue)", 1, Color.MOSTLY_WHITE)
-        text_line_rect = text_line.get_rect(centerx = game_constants.w / 2, bottom = game_constants.h - 20)
-        self.screen.blit(text_line, text_line_rect)
-
-        pygame.display.update()
-        self.dirty = False
+        self.widgets = [
+            Label("INTENSE OPTIONS SCREEN", 32, centerx = game_constants.w / 2, top = 20),
+            self.feeds_group,
+            self.enemy_group,
+            Label("(Space to select, return to continue)", 16, centerx = game_constants.w / 2, bottom = game_constants.h - 20),
+        ]
 
     def handleKeydown(self, event_key):
         if event_key == K_RETURN:
@@ -520,6 +733,7 @@ class PlatformingScene(BaseScene):
 
         self.background_drawn = False
         self.headersize = 30
+        self.dirty_regions = DirtyRegions(screen.get_rect())
 
         self.camera = pygame.rect.Rect(0, 0, game_constants.w, game_constants.h)
         self.special_chars = SpecialChars()
@@ -534,17 +748,15 @@ class PlatformingScene(BaseScene):
         self.platforms = {}
         self.platforms[game_constants.h - 80] = [general.Box(-10000, game_constants.h - 80, 20000, 16)]
 
-        self.statics = RenderUpdatesDraw()
+        self.statics = IndexedGroup() # Every platform in the world, spatially hashed
         self.statics.add(self.platforms.values()[0])
-        self.screenstatics = RenderUpdatesDraw()
+        self.screenstatics = OverlayDraw()
         self.actives = RenderUpdatesDraw()
         self.powerups = RenderUpdatesDraw()
 
-        self.place_platforms()
-        self.player.colliders = self.screenstatics
-
-        self.header = pygame.Surface((screen.get_width(), self.headersize))
+        self.header = pygame.Surface((screen.get_width(), self.headersize)).convert()
         self.header.fill(Color.BLACK)
+        self.hud = Hud(self.header, self.score, self.health)
 
         self.background = pygame.Surface(screen.get_size()).convert()
 
@@ -554,6 +766,33 @@ class PlatformingScene(BaseScene):
             rect = (0, i * game_constants.h / gradiation, game_constants.w, game_constants.h / gradiation + 1)
             self.background.fill(color, rect)
 
+        # Hills in front of the sky, drifting by slower than the platforms. Each one is solid below
+        # its ridge, and the nearer hills are pre-rendered in front of that
+        self.scenery = []
+        for color, top, height, rate, seed in ((Color.far_hills, .4, .16, .2, 1), (Color.near_hills, .58, .18, .45, 2)):
+            hills = Scenery(self.background, color, int(game_constants.h * top), int(game_constants.h * height), rate, seed)
+            self.background.fill(color, (0, hills.rect.bottom, game_constants.w, game_constants.h - hills.rect.bottom))
+            self.scenery.append(hills)
+
+        # Platform tiles never change, so they're kept drawn over the background and only scrolled
+        self.layer = StaticLayer(self.background, self.statics, self.scenery)
+
+        self.place_platforms()
+        self.player.colliders = self.screenstatics
+
+        self.broadphase = SweepAndPrune(
+            {
+                'player'   : self.playergroup,
+                'statics'  : self.screenstatics,
+                'actives'  : self.actives,
+                'powerups' : self.powerups,
+            },
+            [('player', 'actives'), ('player', 'powerups')])
+        self.player.broadphase = self.broadphase
+
+        self.opponent_index = PointIndex() # Where every active is, as of the end of the last tick
+        self.culled = 0 # Sprites left undrawn last frame for being out of view
+
         # Move sprites into or out of 'screenstatics' group based on whether they're in camera
         self.screencheck()
 
@@ -573,6 +812,7 @@ class PlatformingScene(BaseScene):
         bad_platforms = [p for p in platform_level if p.rect.left > max_right or p.rect.right < min_left]
         [platform_level.remove(p) for p in bad_platforms]
         [self.statics.remove(p) for p in bad_platforms]
+        [self.layer.invalidate(p.rect) for p in bad_platforms]
 
         # add on platforms until the limit is reached
         if not len(platform_level):
@@ -589,6 +829,7 @@ class PlatformingScene(BaseScene):
             new_p = Platform(new_start, height, new_width, 16)
             platform_level.append(new_p)
             self.statics.add(new_p)
+            self.layer.invalidate(new_p.rect)
             rightmost = new_start + new_width
         while leftmost > min_left:
             new_start = leftmost - random.randint(150, 300)
@@ -597,6 +838,7 @@ class PlatformingScene(BaseScene):
             new_p = Platform(new_start - new_width, height, new_width, 16)
             platform_level.append(new_p)
             self.statics.add(new_p)
+            self.layer.invalidate(new_p.rect)
             leftmost = new_start - new_width
 
     def place_platforms(self):
@@ -615,30 +857,30 @@ class PlatformingScene(BaseScene):
     def draw_background(self):
         self.screen.blit(self.background, (0, 0))
         self.screen.blit(self.header, (0, 0))
-        pygame.display.update()
+        general.present(self.screen)
         self.background_drawn = True
 
-    def draw_header(self):
-        dirty = []
-        self.screen.set_clip(0, 0, game_constants.w, self.headersize) # Only draw in header area
-        self.score.clear(self.screen, self.header)
-        self.health.clear(self.screen, self.header)
-        dirty += self.score.draw(self.screen, self.time_elapsed)
-        dirty += self.health.draw(self.screen)
-        return dirty
+    def draw_header(self, surface):
+        surface.set_clip(0, 0, game_constants.w, self.headersize) # Only draw in header area
+        return self.hud.draw(surface, self.time_elapsed)
 
     def draw(self):
+        if isinstance(self.screen, GLCanvas):
+            return self.draw_everything()
+
         if not self.background_drawn:
             self.draw_background()
 
         self.camshift()
 
-        header_dirty = self.draw_header()
+        screen = self.screen
+
+        header_dirty = self.draw_header(screen)
 
         dirty = []
 
         # Don't draw over header
-        self.screen.set_clip(0, self.headersize, game_constants.w, game_constants.h)
+        screen.set_clip(0, self.headersize, game_constants.w, game_constants.h)
 
         rect_sources = [
             self.screenstatics,
@@ -648,20 +890,54 @@ class PlatformingScene(BaseScene):
             self.player.bullets,
         ]
 
-        for rect_source in rect_sources:
-            rect_source.clear(self.screen, self.background)
+        # Whatever changed underneath comes straight off the static layer; if that was all
+        # of it, clearing the sprites individually would be wasted
+        changed = self.layer.follow(self.camera)
+        dirty += screen.blits([(self.layer.surface, rect, rect) for rect in changed])
+        if self.layer.surface.get_rect() not in changed:
+            for rect_source in rect_sources:
+                rect_source.clear(screen, self.layer.surface)
 
+        # Sprites only need to know where the camera is, as plain ints
+        offset = self.camera.topleft
         for rect_source in rect_sources:
-            dirty += rect_source.draw(self.screen, self.camera)
+            dirty += rect_source.draw(screen, offset)
+        self.culled = sum(rect_source.culled for rect_source in rect_sources)
 
         # hack: repaint selected_opponent to make sure it's visible
         if self.player.selected_opponent:
-            dirty += [self.player.selected_opponent.draw(self.screen, self.camera)]
+            dirty += [self.player.selected_opponent.draw(screen, offset)]
 
         # Constrain all dirty rectangles in main game area to main game area.
-        dirty = [dirty_rect.clip(self.screen.get_clip()) for dirty_rect in dirty]
+        dirty = [dirty_rect.clip(screen.get_clip()) for dirty_rect in dirty]
+
+        return self.dirty_regions.coalesce(header_dirty + dirty)
+
+    def draw_everything(self):
+        """ The whole frame from scratch, for screens that don't keep the last one around """
+        self.camshift()
 
-        return header_dirty + dirty
+        self.screen.set_clip()
+        self.screen.blit(self.background, (0, 0))
+        for scenery in self.scenery:
+            scenery.draw(self.screen, self.camera.left)
+        self.hud.update(self.time_elapsed)
+        self.screen.blit(self.hud.surface, (0, 0))
+
+        self.screen.set_clip(0, self.headersize, game_constants.w, game_constants.h)
+        offset = self.camera.topleft
+        view = self.screen.get_clip().move(offset).inflate(2, 2)
+        self.culled = 0
+        for rect_source in (self.screenstatics, self.powerups, self.actives, self.playergroup, self.player.bullets):
+            for sprite in rect_source:
+                if rect_source.visible(sprite, view):
+                    sprite.draw(self.screen, offset)
+                else:
+                    self.culled += 1
+        if self.player.selected_opponent:
+            self.player.selected_opponent.draw(self.screen, offset)
+
+        return [self.screen.get_rect()]
 
     def camshift(self):
         newpos = self.player.rect
@@ -680,25 +956,23 @@ class PlatformingScene(BaseScene):
     def screencheck(self):
         """Classify objects by whether they are on the screen"""
 
-        for platform_level in self.platforms.values():
-            for platform in platform_level:
-                if platform not in self.screenstatics:
-                    # This platform wasn't on the screen: is it now?
-                    if platform.rect.colliderect(self.camera):
-                        self.screenstatics.add(platform)
-                        # If it's a platform (has the attribute'word') give it an
-                        #   identifying word while it's onscreen
-                        if hasattr(platform, 'word'):
-                            platform.word = Word(self.special_chars.new(), platform.font)
-                else:
-                    # This platform is on the screen: is it gone now?
-                    if not platform.rect.colliderect(self.camera):
-                        self.screenstatics.remove(platform)
-                        # If it's a platform (has the attribute'word')
-                        #  and it's out of camera, free up its symbol for later use
-                        if hasattr(platform, 'word'):
-                            self.special_chars.release(platform.word.string)
-                            platform.word = None
+        for platform in self.screenstatics.sprites():
+            # This platform is on the screen: is it gone now?
+            if not platform.rect.colliderect(self.camera):
+                self.screenstatics.remove(platform)
+                # If it's a platform (has the attribute'word')
+                #  and it's out of camera, free up its symbol for later use
+                if hasattr(platform, 'word'):
+                    self.special_chars.release(platform.word.string)
+                    platform.word = None
+        # Only platforms near the camera can have come onscreen; ask the index rather than the whole world
+        for platform in self.statics.index.query(self.camera):
+            if platform not in self.screenstatics:
+                self.screenstatics.add(platform)
+                # If it's a platform (has the attribute'word') give it an
+                #   identifying word while it's onscreen
+                if hasattr(platform, 'word'):
+                    platform.word = Word(self.special_chars.new(), platform.font)
         for sprite in self.powerups.sprites():
             if not sprite.rect.colliderect(self.camera.inflate(game_constants.w, 0)):
                 sprite.kill()
@@ -744,12 +1018,28 @@ class PlatformingScene(BaseScene):
         self.place_platforms()
 
         self.time_elapsed += elapsed
+        self.statics.sightlines.new_frame()
 
         for direction in self.movelist:
             self.player.direct(direction)
 
+        # Opponents still standing where they were last tick already know their ground distance;
+        # resolve everyone else's in one batch rather than per sprite
+        grounds = {}
+        missed = []
         for active_obj in self.actives:
-            active_obj.tick(self.player.rect.center)
+            if active_obj.grounded:
+                ground = active_obj.contacts.cached_ground(active_obj.rect, self.statics)
+                if ground is None:
+                    missed.append(active_obj)
+                else:
+                    grounds[active_obj] = ground
+        for active_obj, ground in zip(missed, distsfromground([active_obj.rect for active_obj in missed], self.statics)):
+            active_obj.contacts.found_ground(active_obj.rect, self.statics, ground)
+            grounds[active_obj] = ground
+
+        for active_obj in self.actives.sprites():
+            active_obj.tick(self.player.rect.center, grounds.get(active_obj))
 
         for powerup in self.powerups:
             powerup.tick()
@@ -761,6 +1051,8 @@ class PlatformingScene(BaseScene):
                 screenstatic.reachable = self.is_reachable(screenstatic)
         self.player.tick()
 
+        self.opponent_index.rebuild(self.actives)
+
         if (self.health.value() <= 0):
             self.switch_to = GameOverScene(self.screen)
 
@@ -773,26 +1065,49 @@ class PlatformingScene(BaseScene):
                             return platform
 
 class ChallengeScene(BaseScene):
-    def __init__(self, screen, sentence):
-        self.screen = screen
+    """ A sentence to type out, standing between the player and a commando. The stage is drawn onto
+        its own surface once; after that a frame is the sliding message and whichever lines of the
+        sentence were typed on, so paragraph-length sentences cost no more a keystroke than short ones.
+        Goes to 'back' when the sentence is done, or on return.
+    """
+
+    def __init__(self, screen, sentence, back = None):
+        super(ChallengeScene, self).__init__(screen)
         self.font = GetFont(40)
         self.challenge_message = self.font.render("TYPING CHALLENGE!", 0, Color.MOSTLY_WHITE)
         self.rect = None
-        self.screen.fill(Color.BLACK_YELLOW)
         self.frames = 0
-
-        pygame.draw.rect(screen, (100, 30, 200), (-10000, game_constants.h - 80, 20000, 10), 0)
+        self.sentence = sentence
+        self.sentence_position = (game_constants.w / 2, game_constants.h / 2)
+        self.back = back
+        self.drawn = False
+
+        self.stage = pygame.Surface(screen.get_size()).convert()
+        self.stage.fill(Color.BLACK_YELLOW)
+        pygame.draw.rect(self.stage, (100, 30, 200), (0, game_constants.h - 80, game_constants.w, 10), 0)
         player = Player((0, 0))
-        player.idleright.draw(screen, (game_constants.w / 8, game_constants.h - 80 - 38))
-        from opponents import Commando
-        commando = Commando("buttes", (0, 0))
-        commando.idleleft.draw(screen, (game_constants.w * (7 / 8.0), game_constants.h - 80 - 35))
+        player.anims[States.idle]['r'].draw(self.stage, (game_constants.w / 8, game_constants.h - 80 - 38))
+        commando = Commando(sentence, (0, 0))
+        commando.idleleft.draw(self.stage, (game_constants.w * (7 / 8.0), game_constants.h - 80 - 35))
 
-        sentence.draw(screen, (game_constants.w / 2, game_constants.h / 2))
+    def lazy_redraw(self):
+        return False
 
-    def draw(self):
+    def tick(self, elapsed):
         self.frames += 1
 
+    def handleKeydown(self, event_key):
+        if event_key == K_RETURN:
+            self.switch_to = self.back
+        elif event_key in range(256) and not self.sentence.done():
+            key = chr(event_key)
+            if pygame.key.get_mods() & KMOD_SHIFT:
+                key = key.upper()
+            self.sentence.typeon(key)
+            if self.sentence.done():
+                self.switch_to = self.back
+
+    def draw(self):
         if self.frames < 100:
             percent = self.frames / 100.0
             xpos = percent * game_constants.w / 2
@@ -808,8 +1123,18 @@ class ChallengeScene(BaseScene):
         if 200 < self.frames < 455: # Transparent fadeout of text
             self.challenge_message.set_alpha(255 - (self.frames - 200))
 
-        if self.rect:
-            self.screen.fill(Color.BLACK_YELLOW, self.rect)
+        # Only real surfaces keep the last frame around to draw over
+        if not self.drawn or not isinstance(self.screen, pygame.Surface):
+            self.screen.blit(self.stage, (0, 0))
+            self.sentence.draw(self.screen, self.sentence_position)
+            dirty = [self.screen.get_rect()]
+            self.drawn = True
+        else:
+            dirty = self.sentence.draw_changed(self.screen, self.sentence_position)
+            self.screen.blit(self.stage, self.rect, self.rect)
+            dirty.append(self.rect)
         self.screen.blit(self.challenge_message, message_rectangle)
+        dirty.append(message_rectangle)
 
         self.rect = message_rectangle
+        return dirty
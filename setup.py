@@ -14,7 +14,8 @@ opts = {
 } 
  
 def filesinpath(path,ext):
-  return [os.path.abspath(os.path.join(path,file)) for file in os.listdir(path) if file.endswith(ext)]
+  # packsprites.py puts a sheet.png and sheet.txt in each directory, ship those too
+  return [os.path.abspath(os.path.join(path,file)) for file in os.listdir(path) if file.endswith((ext, 'sheet.png', 'sheet.txt'))]
  
 setup(
  
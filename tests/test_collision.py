@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+import unittest
+import random
+import collision
+import general
+import pygame
+
+class Static(pygame.sprite.Sprite):
+    def __init__(self, x, y, w, h):
+        super(Static, self).__init__()
+        self.rect = pygame.rect.Rect(x, y, w, h)
+
+def random_platforms(count):
+    return [Static(random.randint(-3000, 3000), random.randint(-20, 20) * 80, random.randint(1, 60) * 16, 16)
+            for _ in xrange(count)]
+
+def random_rects(count):
+    return [pygame.rect.Rect(random.randint(-3200, 3200), random.randint(-2000, 2000), random.randint(0, 60), random.randint(0, 60))
+            for _ in xrange(count)]
+
+class testSpatialHash (unittest.TestCase):
+    def setUp(self):
+        random.seed(42)
+        self.platforms = random_platforms(300)
+        self.linear = pygame.sprite.Group(self.platforms)
+        self.indexed = collision.IndexedGroup(self.platforms)
+
+    def testMatchesLinearScan(self):
+        for rect in random_rects(500):
+            self.assertEqual(collision.distfromground(rect, self.indexed),
+                             collision.distfromground(rect, self.linear))
+            self.assertEqual(collision.distfromceiling(rect, self.indexed),
+                             collision.distfromceiling(rect, self.linear))
+
+    def testQuery(self):
+        for rect in random_rects(100):
+            expected = set(p for p in self.platforms if p.rect.colliderect(rect))
+            self.assertEqual(self.indexed.index.query(rect), expected)
+
+    def testRemovalKeepsIndexInSync(self):
+        for platform in self.platforms[:150]:
+            platform.kill()
+        self.assertEqual(len(self.indexed.index.sprite_cells), 150)
+        for rect in random_rects(200):
+            self.assertEqual(collision.distfromground(rect, self.indexed),
+                             collision.distfromground(rect, self.linear))
+
+    def testBatchMatchesSingleQueries(self):
+        rects = random_rects(200)
+        grounds = collision.distsfromground(rects, self.indexed)
+        self.assertEqual(grounds, [collision.distfromground(rect, self.linear) for rect in rects])
+
+        # A plain group gets packed on the fly
+        self.assertEqual(collision.distsfromground(rects, self.linear), grounds)
+        self.assertEqual(collision.distsfromground([], self.indexed), [])
+
+class testLineOfSight (unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+        self.platforms = random_platforms(300)
+        self.indexed = collision.IndexedGroup(self.platforms)
+
+    def testSegmentHitsRect(self):
+        rect = pygame.rect.Rect(0, 0, 100, 16)
+        self.assertTrue(collision.segment_hits_rect((-50, 8), (150, 8), rect))
+        self.assertTrue(collision.segment_hits_rect((50, -50), (50, 50), rect))
+        self.assertTrue(collision.segment_hits_rect((-10, -10), (10, 10), rect))
+        self.assertFalse(collision.segment_hits_rect((-50, 8), (-1, 8), rect))
+        self.assertFalse(collision.segment_hits_rect((-10, -20), (120, -1), rect))
+        self.assertFalse(collision.segment_hits_rect((-40, 30), (0, -30), rect))
+
+    def testPackedMatchesSingle(self):
+        packed = collision.packrects(self.platforms)
+        for _ in xrange(300):
+            start = random.randint(-3000, 3000), random.randint(-1600, 1600)
+            dest = start[0] + random.randint(-800, 800), start[1] + random.randint(-800, 800)
+            expected = any(collision.segment_hits_rect(start, dest, p.rect) for p in self.platforms)
+            self.assertEqual(collision.segment_hits_packed(start, dest, packed), expected)
+
+    def testSightLinesAreCachedPerFrame(self):
+        sightlines = self.indexed.sightlines
+        sightlines.new_frame()
+        first = collision.clearshot((3, 5), (900, 700), self.indexed)
+        self.assertEqual(collision.clearshot((4, 6), (901, 701), self.indexed), first)
+        self.assertEqual((sightlines.hits, sightlines.misses), (1, 1))
+
+        sightlines.new_frame()
+        self.assertEqual((sightlines.hits, sightlines.misses, sightlines.cache), (0, 0, {}))
+
+class testSweep (unittest.TestCase):
+    def setUp(self):
+        self.wall = Static(100, 0, 16, 100)
+        self.floor = Static(-500, 100, 1000, 16)
+        self.statics = collision.IndexedGroup(self.wall, self.floor)
+
+    def testClearPath(self):
+        self.assertEqual(collision.sweep(pygame.rect.Rect(0, 50, 20, 50), (50, 0), self.statics), (1.0, None, None))
+
+    def testStopsFlushAgainstWall(self):
+        rect = pygame.rect.Rect(0, 50, 20, 50)
+        toi, normal, hit = collision.sweep(rect, (160, 0), self.statics)
+        self.assertEqual((toi, normal, hit), (0.5, (-1, 0), self.wall))
+        self.assertFalse(rect.move(160 * toi, 0).colliderect(self.wall.rect))
+
+    def testLandsOnFloor(self):
+        rect = pygame.rect.Rect(-200, 0, 20, 50)
+        self.assertEqual(collision.sweep(rect, (0, 100), self.statics), (0.5, (0, -1), self.floor))
+
+    def testStandingOnFloorDoesNotBlockRunning(self):
+        rect = pygame.rect.Rect(-200, 50, 20, 50)
+        self.assertEqual(collision.sweep(rect, (-2, 0), self.statics), (1.0, None, None))
+
+    def testGroundBelow(self):
+        self.assertEqual(collision.groundbelow(pygame.rect.Rect(-200, -300, 20, 50), self.statics), 100)
+        self.assertEqual(collision.groundbelow(pygame.rect.Rect(104, -300, 4, 4), self.statics), 0)
+        self.assertEqual(collision.groundbelow(pygame.rect.Rect(900, -300, 20, 50), self.statics), None)
+
+    def testFreeAbove(self):
+        self.assertEqual(collision.freeabove(pygame.rect.Rect(-200, 0, 20, 50), self.statics), 50)
+        # Inside the floor, then inside the wall sitting on it
+        self.assertEqual(collision.freeabove(pygame.rect.Rect(95, 80, 20, 30), self.statics), 0)
+        self.assertEqual(collision.freeabove(pygame.rect.Rect(95, 80, 20, 30), [self.wall, self.floor]), 0)
+
+    def testCanLeaveSomethingAlreadyOverlapped(self):
+        rect = pygame.rect.Rect(95, 50, 20, 50)
+        self.assertEqual(collision.sweep(rect, (-2, 0), self.statics), (1.0, None, None))
+
+class testContactCache (unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        self.platforms = random_platforms(300)
+        self.statics = collision.IndexedGroup(self.platforms)
+        collision.ContactCache.hits = collision.ContactCache.misses = 0
+
+    def testMatchesFullQueryWhileWalking(self):
+        for platform in self.platforms[:20]:
+            cache = collision.ContactCache()
+            rect = pygame.rect.Rect(platform.rect.left - 30, platform.rect.top - 40, 20, 40)
+            for step in xrange(platform.rect.width / 4 + 20):
+                rect.move_ip(4, 0)
+                self.assertEqual(cache.ground(rect, self.statics), collision.distfromground(rect, self.statics))
+        # Mostly running along the top of the same platform
+        self.assertTrue(collision.ContactCache.hits > collision.ContactCache.misses)
+
+    def testCeilingMatchesFullQuery(self):
+        cache = collision.ContactCache()
+        for rect in random_rects(300) + [pygame.rect.Rect(p.rect.left + 5, p.rect.bottom, 20, 40) for p in self.platforms[:50]]:
+            self.assertEqual(cache.ceiling(rect, self.statics), collision.distfromceiling(rect, self.statics))
+
+    def testSupportThatLeavesIsNotTrusted(self):
+        cache = collision.ContactCache()
+        floor = Static(0, 100, 200, 16)
+        statics = collision.IndexedGroup(floor, Static(0, 300, 200, 16))
+        rect = pygame.rect.Rect(50, 60, 20, 40)
+        self.assertEqual(cache.ground(rect, statics), 0)
+        self.assertTrue(cache.support is floor)
+        floor.kill()
+        self.assertEqual(cache.ground(rect, statics), 200)
+        self.assertEqual((collision.ContactCache.hits, collision.ContactCache.misses), (0, 2))
+
+class Ring(general.WrappedSprite):
+    """ 20x20 sprite that is either a 2px hollow border or a single 2px dot in the middle """
+
+    @classmethod
+    def loadImages(cls):
+        super(Ring, cls).loadImages()
+        ring = pygame.Surface((20, 20), pygame.SRCALPHA, 32)
+        pygame.draw.rect(ring, (255, 255, 255, 255), ring.get_rect(), 2)
+        dot = pygame.Surface((20, 20), pygame.SRCALPHA, 32)
+        dot.fill((255, 255, 255, 255), (9, 9, 2, 2))
+        cls.images['ring'] = [ring]
+        cls.images['dot'] = [dot]
+
+    def __init__(self, (x, y), name = 'ring'):
+        super(Ring, self).__init__()
+        self.current_anim = general.Anim(self.images[name], (10,))
+        self.rect = pygame.rect.Rect(x, y, 20, 20)
+
+class testMasks (unittest.TestCase):
+    def testMasksBuiltOncePerFrame(self):
+        masks = Ring((0, 0)).masks
+        Ring((5, 5))
+        self.assertTrue(Ring.masks is masks)
+        self.assertEqual(set(masks.keys()), set(Ring.images['ring'] + Ring.images['dot']))
+
+    def testEmptySpaceDoesNotCollide(self):
+        ring = Ring((0, 0))
+        dot = Ring((3, 3), 'dot')
+        self.assertTrue(ring.rect.colliderect(dot.rect))
+        self.assertFalse(collision.masks_collide(ring, dot))
+
+        self.assertTrue(collision.masks_collide(ring, Ring((10, 10))))
+        self.assertTrue(collision.masks_collide(ring, Static(5, 5, 2, 2))) # No mask: solid rect
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+class testPointIndex (unittest.TestCase):
+    def setUp(self):
+        random.seed(11)
+        self.points = [Point(random.uniform(-1000, 1000), random.uniform(-600, 600)) for _ in xrange(300)]
+        self.index = collision.PointIndex()
+        self.index.rebuild(self.points)
+
+    def dist(self, point, (x, y)):
+        return ((point.x - x) ** 2 + (point.y - y) ** 2) ** .5
+
+    def testRadius(self):
+        for _ in xrange(50):
+            center = random.uniform(-1100, 1100), random.uniform(-700, 700)
+            radius = random.uniform(0, 300)
+            self.assertEqual(set(self.index.radius(center[0], center[1], radius)),
+                             set(p for p in self.points if self.dist(p, center) <= radius))
+
+    def testNearest(self):
+        for _ in xrange(50):
+            center = random.uniform(-3000, 3000), random.uniform(-2000, 2000)
+            expected = sorted(self.points, key = lambda p: self.dist(p, center))[:5]
+            self.assertEqual(self.index.nearest(center[0], center[1], 5), expected)
+        self.assertEqual(collision.PointIndex().nearest(0, 0, 3), [])
+
+    def testChainReachesAcrossTheWholeLine(self):
+        line = [Point(i * 50, 0) for i in xrange(200)]
+        stray = Point(0, 500)
+        self.index.rebuild(line + [stray])
+        self.assertEqual(self.index.chain([line[0]], 60), set(line))
+        self.assertEqual(self.index.chain([line[0]], 60, lambda p: p is not line[100]), set(line[:100]))
+
+class testSweepAndPrune (unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.actives = pygame.sprite.Group([Static(random.randint(0, 2000), random.randint(0, 600), 30, 40) for _ in xrange(200)])
+        self.powerups = pygame.sprite.Group([Static(random.randint(0, 2000), random.randint(0, 600), 16, 16) for _ in xrange(20)])
+        self.player = Static(1000, 300, 400, 300)
+        self.broadphase = collision.SweepAndPrune(
+            {'player' : pygame.sprite.Group(self.player), 'actives' : self.actives, 'powerups' : self.powerups},
+            [('player', 'actives'), ('player', 'powerups')])
+
+    def brute_force(self, group):
+        return set((self.player, sprite) for sprite in group if self.player.rect.colliderect(sprite.rect))
+
+    def testPairsFollowMovementAndMembership(self):
+        for _ in xrange(10):
+            for sprite in self.actives:
+                sprite.rect.move_ip(random.randint(-40, 40), random.randint(-10, 10))
+            self.actives.remove(random.choice(self.actives.sprites()))
+            self.actives.add(Static(random.randint(0, 2000), random.randint(0, 600), 30, 40))
+
+            self.broadphase.update()
+            self.assertEqual(set(self.broadphase.pairs('player', 'actives')), self.brute_force(self.actives))
+            self.assertEqual(set(self.broadphase.pairs('player', 'powerups')), self.brute_force(self.powerups))
+            self.assertEqual(len(self.broadphase.entries), len(self.actives) + len(self.powerups) + 1)
+
+    def testQuery(self):
+        self.powerups.add(Static(-10000, 400, 20000, 16)) # Too wide to bisect for
+        self.broadphase.update()
+        for _ in xrange(50):
+            rect = pygame.rect.Rect(random.randint(-100, 2000), random.randint(0, 600), random.randint(0, 400), random.randint(0, 300))
+            for tag, group in (('powerups', self.powerups), ('actives', self.actives)):
+                self.assertEqual(set(self.broadphase.query(rect, tag)),
+                                 set(sprite for sprite in group if sprite.rect.colliderect(rect)))
+
+if __name__ == '__main__':
+    unittest.main()
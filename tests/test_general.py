@@ -2,7 +2,9 @@
 
 import unittest
 import general
+import packsprites
 import pygame
+import os, random, shutil, tempfile
 
 class testWordMaker (unittest.TestCase):
     def setUp(self):
@@ -24,5 +26,260 @@ class testWordMaker (unittest.TestCase):
         only_b  = [self.wordmaker.next_word(['a']) for _ in xrange(100)]
         self.assertEqual(set([word.string[0] for word in only_b]), set(['b']))
 
+class testGlyphAtlas (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.font = general.GetFont(24)
+        self.atlas = general.GetGlyphAtlas(self.font, general.Color.text_normal)
+
+    def testSharedPerFontAndColor(self):
+        self.assertTrue(general.GetGlyphAtlas(self.font, list(general.Color.text_normal)) is self.atlas)
+        self.assertFalse(general.GetGlyphAtlas(self.font, general.Color.text_typed) is self.atlas)
+
+    def testMatchesFontRender(self):
+        for text in ('Typer Combat', 'AVAWAY To. Ty', 'jumping quickly!', 'x'):
+            rendered = self.font.render(text, 1, general.Color.text_normal)
+            composed = self.atlas.render(text)
+            self.assertEqual(composed.get_size(), rendered.get_size())
+            for x in xrange(0, rendered.get_width(), 3):
+                for y in xrange(rendered.get_height()):
+                    self.assertEqual(composed.get_at((x, y)).a, rendered.get_at((x, y)).a)
+        self.assertEqual(self.atlas.render('').get_size(), self.font.render('', 1, general.Color.text_normal).get_size())
+
+    def testWordDoesNotRasterizeAfterWarmup(self):
+        word = general.Word('glyph atlas', self.font)
+        glyphs = dict(self.atlas.glyphs)
+        for char in word.string:
+            word.typeon(char)
+        word.reset()
+        self.assertEqual(self.atlas.glyphs, glyphs)
+
+class testWordBadge (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.surface = pygame.Surface((640, 480))
+        self.word = general.Word('badge', general.GetFont(16))
+
+    def testComposedOnlyWhenSomethingChanges(self):
+        first = self.word.draw(self.surface, (100, 100))
+        badge = self.word.badge
+        self.assertEqual(self.word.draw(self.surface, (300, 200)), first.move(200, 100))
+        self.assertTrue(self.word.badge is badge)
+
+        self.word.typeon('b')
+        self.word.draw(self.surface, (100, 100))
+        self.assertFalse(self.word.badge is badge)
+
+        badge = self.word.badge
+        self.word.draw(self.surface, (100, 100), general.Color.word_select)
+        self.assertFalse(self.word.badge is badge)
+
+        self.word.reset()
+        self.assertEqual(self.word.badge, None)
+
+class testSentence (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.surface = pygame.Surface((640, 480))
+        self.text = ("a sentence far too long for one line, so it gets broken up "
+                     "into a few of them before anything is typed on it")
+        self.sentence = general.Word(self.text, general.GetFont(16))
+
+    def testLinesBreakBetweenWords(self):
+        lines = [self.text[start:end] for start, end in self.sentence.lines]
+        self.assertTrue(len(lines) > 1)
+        self.assertEqual(' '.join(lines), self.text)
+        for line in lines:
+            self.assertTrue(len(line) <= general.game_constants.line_char_limit)
+
+    def testTypingRendersOnlyItsLine(self):
+        self.sentence.draw(self.surface, (320, 100))
+        images = list(self.sentence.line_images)
+        for char in self.text[:5]:
+            self.assertTrue(self.sentence.typeon(char))
+        self.assertEqual(self.sentence.changed, [0])
+        self.assertFalse(self.sentence.line_images[0] is images[0])
+        self.assertEqual(self.sentence.line_images[1:], images[1:])
+
+        # Only the changed line goes on the screen, and it ends up the same as drawing everything
+        rects = self.sentence.draw_changed(self.surface, (320, 100))
+        self.assertEqual(len(rects), 1)
+        self.assertEqual(self.sentence.changed, [])
+        everything = pygame.Surface((640, 480))
+        self.sentence.draw(everything, (320, 100))
+        self.assertTrue(pygame.image.tostring(self.surface, 'RGB') == pygame.image.tostring(everything, 'RGB'))
+
+class testBox (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        pygame.display.set_mode((640, 480))
+        general.Box.tiled.clear()
+
+    def testSharedByWidth(self):
+        self.assertTrue(general.Box(0, 0, 320, 16).image is general.Box(500, 80, 320, 16).image)
+        self.assertFalse(general.Box(0, 0, 336, 16).image is general.Box(0, 0, 320, 16).image)
+        self.assertEqual(general.Box(0, 0, 20000, 16).image, None)
+
+    def testCacheIsBounded(self):
+        boxes = [general.Box(0, 0, (i + 1) * 16, 16) for i in xrange(general.Box.max_tiled * 2)]
+        self.assertEqual(len(general.Box.tiled), general.Box.max_tiled)
+        self.assertFalse(general.Box(0, 0, 16, 16).image is boxes[0].image)
+        self.assertTrue(general.Box(0, 0, len(boxes) * 16, 16).image is boxes[-1].image)
+
+class Blip(pygame.sprite.Sprite):
+    def __init__(self, x, y):
+        super(Blip, self).__init__()
+        self.rect = pygame.rect.Rect(x, y, 10, 10)
+
+    def draw(self, surface, campos):
+        return self.rect.move(-campos[0], -campos[1])
+
+class testDirtyRegions (unittest.TestCase):
+    def setUp(self):
+        self.regions = general.DirtyRegions((0, 0, 800, 600))
+
+    def testMergesOverlappingAndNearby(self):
+        rects = [pygame.rect.Rect(100, 100, 40, 40), pygame.rect.Rect(120, 120, 40, 40), pygame.rect.Rect(165, 100, 10, 10)]
+        self.assertEqual(self.regions.coalesce(rects), [pygame.rect.Rect(100, 100, 75, 60)])
+        self.assertEqual((self.regions.rects_in, self.regions.rects_out, self.regions.full), (3, 1, False))
+
+    def testKeepsDistantRectsApart(self):
+        rects = [pygame.rect.Rect(0, 0, 30, 30), pygame.rect.Rect(700, 500, 30, 30), pygame.rect.Rect(300, 300, 0, 30)]
+        self.assertEqual(self.regions.coalesce(rects), rects[:2])
+        self.assertEqual(self.regions.area, 1800)
+
+    def testFullScreenPastThreshold(self):
+        rects = [pygame.rect.Rect(0, 0, 800, 200), pygame.rect.Rect(0, 400, 800, 200)]
+        self.assertEqual(self.regions.coalesce(rects), [pygame.rect.Rect(0, 0, 800, 600)])
+        self.assertTrue(self.regions.full)
+
+    def testSpriteThatJumpsDirtiesBothEnds(self):
+        blip = Blip(0, 0)
+        group = general.RenderUpdatesDraw(blip)
+        surface = pygame.Surface((800, 600))
+        group.draw(surface, (0, 0))
+        blip.rect.topleft = (500, 400)
+        self.assertEqual(group.draw(surface, (0, 0)), [pygame.rect.Rect(0, 0, 10, 10), pygame.rect.Rect(500, 400, 10, 10)])
+        blip.rect.move_ip(4, 0)
+        self.assertEqual(group.draw(surface, (0, 0)), [pygame.rect.Rect(500, 400, 14, 10)])
+
+    def testOutOfViewSpritesAreCulled(self):
+        class Bounded(Blip):
+            draws = 0
+            def bounds(self):
+                return self.rect
+            def draw(self, surface, campos):
+                self.draws += 1
+                return Blip.draw(self, surface, campos)
+
+        blip = Bounded(100, 100)
+        group = general.RenderUpdatesDraw(blip)
+        surface = pygame.Surface((800, 600))
+        self.assertTrue(group.visible(Blip(-500, 0), surface.get_rect())) # No bounds, so always drawn
+        group.draw(surface, (0, 0))
+        self.assertEqual((blip.draws, group.culled), (1, 0))
+
+        # Scrolled out of view: only where it was needs updating, and there's nothing left to clear
+        self.assertEqual(group.draw(surface, (1000, 0)), [pygame.rect.Rect(100, 100, 10, 10)])
+        self.assertEqual((blip.draws, group.culled, group.spritedict[blip]), (1, 1, 0))
+        self.assertEqual(group.draw(surface, (1000, 0)), [])
+
+        # The clip area is what counts, not the whole surface
+        surface.set_clip(0, 200, 800, 400)
+        group.draw(surface, (0, 0))
+        self.assertEqual(group.culled, 1)
+        group.draw(surface, (0, -150))
+        self.assertEqual((blip.draws, group.culled), (2, 0))
+
+class testGroupClear (unittest.TestCase):
+    def testGoesInOneCall(self):
+        calls = []
+        class Screen:
+            def blits(self, blit_sequence, doreturn = 1):
+                calls.append([dest for source, dest, area in blit_sequence])
+
+        blips = [Blip(i * 20, 10) for i in xrange(5)]
+        group = general.RenderUpdatesDraw(blips)
+        group.draw(pygame.Surface((200, 150)), (0, 0))
+        blips[0].kill()
+        group.clear(Screen(), pygame.Surface((200, 150)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(calls[0]), [pygame.rect.Rect(i * 20, 10, 10, 10) for i in xrange(5)])
+
+class testScaledDisplay (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.window = pygame.display.set_mode((160, 120), 0, 32)
+        self.random = random.Random(4)
+
+    def scribble(self, display, n):
+        rects = []
+        for _ in xrange(n):
+            rect = pygame.rect.Rect(self.random.randrange(display.get_width()), self.random.randrange(display.get_height()),
+                                    self.random.randint(1, 12), self.random.randint(1, 12))
+            display.fill((self.random.randint(0, 3) * 80, self.random.randint(0, 3) * 80, 200), rect)
+            rects.append(rect)
+        return rects
+
+    def assertShowing(self, expected):
+        for x in xrange(expected.get_width()):
+            for y in xrange(expected.get_height()):
+                self.assertEqual(self.window.get_at((x, y)), expected.get_at((x, y)))
+
+    def testDirtyRectsMatchScalingEverything(self):
+        for scale in (2, 3):
+            display = general.ScaledDisplay(self.window, scale)
+            self.assertEqual(display.get_size(), (160 / scale, 120 / scale))
+            self.scribble(display, 100)
+            display.update()
+            for _ in xrange(3):
+                display.update(self.scribble(display, 10))
+            if scale == 2:
+                self.assertShowing(pygame.transform.scale2x(display))
+            else:
+                self.assertShowing(pygame.transform.scale(display, (159, 120)))
+
+class testSpriteSheet (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        pygame.display.set_mode((640, 480))
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+        os.makedirs(os.path.join('data', 'things'))
+        for name, size, color in (('a.png', (20, 30), (255, 0, 0, 255)), ('b.png', (300, 10), (0, 255, 0, 128)), ('c.png', (300, 12), (0, 0, 255, 255))):
+            image = pygame.Surface(size, pygame.SRCALPHA, 32)
+            image.fill(color)
+            image.fill((0, 0, 0, 0), (0, 0, 5, 5)) # Something for a flip to move
+            pygame.image.save(image, os.path.join('data', 'things', name))
+
+    def tearDown(self):
+        general.Sheets.pop('things', None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def assertSamePixels(self, a, b):
+        self.assertEqual(a.get_size(), b.get_size())
+        for x in xrange(a.get_width()):
+            for y in xrange(a.get_height()):
+                self.assertEqual(a.get_at((x, y)), b.get_at((x, y)))
+
+    def testFramesComeOffTheSheet(self):
+        packsprites.packdirectory(os.path.join('data', 'things'))
+        frames = general.loadframes('things', ('a.png', 'b.png', 'c.png'))
+        flipped = general.flippedframes(frames)
+        sheet = general.GetSpriteSheet('things')
+        for name, frame, flip in zip(('a.png', 'b.png', 'c.png'), frames, flipped):
+            self.assertTrue(frame.get_parent() is sheet.image)
+            self.assertTrue(flip.get_parent() is sheet.flipped)
+            original = pygame.image.load(os.path.join('data', 'things', name)).convert_alpha()
+            self.assertSamePixels(frame, original)
+            self.assertSamePixels(flip, pygame.transform.flip(original, True, False))
+
+    def testNoSheet(self):
+        frame = general.loadframes('things', ('a.png',))[0]
+        self.assertEqual(frame.get_parent(), None)
+        self.assertEqual(general.flippedframes([frame])[0].get_size(), (20, 30))
+
 if __name__ == '__main__':
     unittest.main()
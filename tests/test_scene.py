@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+import unittest
+import random
+import pygame
+from pygame.locals import *
+import general
+import scene
+from collision import IndexedGroup
+
+class testStaticLayer (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        pygame.display.set_mode((320, 240))
+        random.seed(9)
+        self.background = pygame.Surface((320, 240), 0, 32)
+        for y in xrange(240):
+            self.background.fill((y, 0, 255 - y), (0, y, 320, 1))
+        # Rows of platforms with gaps between them, like fill_level makes
+        self.statics = IndexedGroup(general.Box(-10000, 200, 20000, 16))
+        for y in xrange(-400, 200, 40):
+            x = random.randint(-3000, -2000)
+            while x < 3000:
+                width = random.randint(1, 40) * 16
+                self.statics.add(general.Box(x, y, width, 16))
+                x += width + random.randint(20, 200)
+
+    def fresh(self, camera, scenery = ()):
+        layer = scene.StaticLayer(self.background, self.statics, scenery)
+        layer.follow(camera)
+        return pygame.image.tostring(layer.surface, 'RGB')
+
+    def _scroll_around(self, scenery):
+        """ Move the camera about at random, checking the layer against painting it from scratch """
+        layer = scene.StaticLayer(self.background, self.statics, scenery)
+        camera = pygame.rect.Rect(0, 0, 320, 240)
+        for step in xrange(60):
+            moved = camera.move(random.choice((-37, -3, 0, 5, 64, 400)), random.choice((0, 0, 0, 20)))
+            expected = [] if step and moved == camera else [layer.surface.get_rect()]
+            camera = moved
+            self.assertEqual(layer.follow(camera), expected)
+            self.assertEqual(pygame.image.tostring(layer.surface, 'RGB'), self.fresh(camera, scenery))
+        self.assertTrue(layer.scrolls > layer.repaints > 0)
+
+    def testScrollingMatchesRepainting(self):
+        self._scroll_around(())
+
+    def testScrollingWithScenery(self):
+        scenery = [scene.Scenery(self.background, (0, 90, 40), 150, 30, .5, 2, period = 200),
+                   scene.Scenery(self.background, (0, 120, 0), 80, 40, .25, 1, period = 256)]
+        self._scroll_around(scenery)
+
+    def testSceneryWrapsAround(self):
+        background = pygame.image.tostring(self.background, 'RGB')
+        hills = scene.Scenery(self.background, (0, 90, 40), 100, 40, .5, 3, period = 128)
+        self.assertTrue(pygame.image.tostring(self.background, 'RGB') == background) # Left as it was
+        left, right = hills.tile.subsurface((0, 0, 1, 40)), hills.tile.subsurface((127, 0, 1, 40))
+        crest = lambda column: [y for y in xrange(40) if column.get_at((0, y)) == (0, 90, 40, 255)][0]
+        self.assertTrue(abs(crest(left) - crest(right)) <= 2)
+
+        # The same hills come round again every 'period' pixels of scrolling at half speed
+        a, b = pygame.Surface((320, 240), 0, 32), pygame.Surface((320, 240), 0, 32)
+        hills.draw(a, -75)
+        hills.draw(b, -75 + 256)
+        self.assertEqual(pygame.image.tostring(a, 'RGB'), pygame.image.tostring(b, 'RGB'))
+
+    def testInvalidate(self):
+        layer = scene.StaticLayer(self.background, self.statics)
+        camera = pygame.rect.Rect(0, 0, 320, 240)
+        layer.follow(camera)
+        box = general.Box(40, 20, 64, 16) # Between two rows
+        self.statics.add(box)
+        layer.invalidate(box.rect)
+        self.assertEqual(layer.follow(camera), [pygame.rect.Rect(40, 20, 64, 16)])
+        self.assertEqual(pygame.image.tostring(layer.surface, 'RGB'), self.fresh(camera))
+        self.assertEqual(layer.follow(camera), [])
+
+class testPlatformingScene (unittest.TestCase):
+    def setUp(self):
+        from opponents import Soldier, Copter, Ghost
+        pygame.init()
+        self.screen = pygame.display.set_mode((640, 480), 0, 32)
+        general.game_constants.w, general.game_constants.h = 640, 480
+        random.seed(3)
+        self.scene = scene.PlatformingScene(self.screen)
+        self.scene.time_elapsed = 1.0
+        words = general.WordMaker(['alpha', 'bravo', 'charlie', 'delta'])
+        for i in xrange(30):
+            self.scene.actives.add((Soldier, Copter, Ghost)[i % 3](words.next_word(), (40 + i * 19, 80 + (i * 53) % 300), self.scene.statics))
+
+    def testDrawingSpritesMakesFewRects(self):
+        """ Drawing the sprites shouldn't build more than a handful of Rects for each, or copy their groups.
+            Only calls to builtins show up in the profiler, so Rect(...) itself isn't counted, but moved,
+            inflated and unioned ones are
+        """
+        import sys
+        rect_makers = ('move', 'inflate', 'union', 'unionall', 'clip', 'clamp', 'fit', 'copy', 'get_rect')
+        group_draw = general.RenderUpdatesDraw.draw.__func__.__code__
+        calls = {'rects' : 0, 'copies' : 0}
+        depth = [0]
+        def profile(frame, event, arg):
+            if frame.f_code is group_draw:
+                if event == 'call': depth[0] += 1
+                elif event == 'return': depth[0] -= 1
+            if event == 'c_call' and depth[0]:
+                owner = getattr(arg, '__self__', None)
+                if isinstance(owner, (pygame.Rect, pygame.Surface)) and arg.__name__ in rect_makers:
+                    calls['rects'] += 1
+                elif isinstance(owner, dict) and arg.__name__ in ('items', 'keys', 'values', 'copy'):
+                    calls['copies'] += 1
+
+        self.scene.draw() # Words compose their badges the first time round
+        sys.setprofile(profile)
+        try:
+            self.scene.draw()
+        finally:
+            sys.setprofile(None)
+
+        groups = (self.scene.screenstatics, self.scene.powerups, self.scene.actives, self.scene.playergroup)
+        sprites = sum(len(group) for group in groups)
+        self.assertEqual(self.scene.culled, 0)
+        self.assertTrue(calls['rects'] <= 5 * sprites, (calls['rects'], sprites))
+        self.assertEqual(calls['copies'], 0)
+
+class testMenu (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.screen = pygame.display.set_mode((640, 480), 0, 32)
+        general.game_constants.w, general.game_constants.h = 640, 480
+
+    def testCursorRepaintsTwoRows(self):
+        menu = scene.Menu(['play', 'instructions', 'options'], 240)
+        self.screen.fill(scene.BaseScene.background)
+        menu.draw(self.screen)
+        self.assertFalse(menu.move(-1))
+        self.assertTrue(menu.move(1))
+        self.assertEqual(menu.repaint(self.screen, scene.BaseScene.background), [menu.rows[0][2], menu.rows[1][2]])
+        self.assertEqual(menu.repaint(self.screen, scene.BaseScene.background), [])
+        self.assertTrue(menu.move(1))
+        self.assertFalse(menu.move(1))
+        self.assertEqual(menu.choice(), 'options')
+        menu.repaint(self.screen, scene.BaseScene.background)
+
+        repainted = pygame.image.tostring(self.screen, 'RGB')
+        self.screen.fill(scene.BaseScene.background)
+        menu.draw(self.screen)
+        self.assertTrue(repainted == pygame.image.tostring(self.screen, 'RGB'))
+
+    def testOptionsOnlyRepaintChangedBoxes(self):
+        options = scene.OptionsScene(self.screen)
+        options.draw()
+        options.handleKeydown(K_DOWN)
+        self.assertEqual(options.feeds_group.repaint(self.screen, options.background),
+                         [options.feeds_group.options[0].box, options.feeds_group.options[1].box])
+        self.assertEqual(options.enemy_group.repaint(self.screen, options.background), [])
+
+class testHud (unittest.TestCase):
+    def setUp(self):
+        pygame.init()
+        self.screen = pygame.display.set_mode((640, 480))
+        header = pygame.Surface((640, 30))
+        header.fill(general.Color.BLACK)
+        self.score = general.Score(self.screen)
+        self.health = scene.Health(5)
+        self.hud = scene.Hud(header, self.score, self.health)
+
+    def testOnlyRedrawnOnChange(self):
+        self.assertEqual(self.hud.draw(self.screen, 1.0), [pygame.rect.Rect(0, 0, 640, 30)])
+        for frame in xrange(100):
+            self.assertEqual(self.hud.draw(self.screen, 1.0 + frame / 60.0), [])
+        self.assertEqual(self.hud.recomposes, 1)
+
+        self.score.miss()
+        self.assertEqual(self.hud.draw(self.screen, 3.0), [pygame.rect.Rect(0, 0, 640, 30)])
+        self.health.decrease()
+        before = self.hud.surface
+        self.assertEqual(len(self.hud.draw(self.screen, 3.0)), 1)
+        self.assertFalse(self.hud.surface is before)
+        self.assertEqual(self.hud.draw(self.screen, 3.0), [])
+
+    def testWpmOnlyWhenTheNumberChanges(self):
+        self.hud.draw(self.screen, 1.0)
+        self.score.increase(5)
+        self.hud.draw(self.screen, 1.0)
+        for frame in xrange(61):
+            self.hud.draw(self.screen, 60.0)
+        self.assertEqual((self.score.wpm, self.hud.recomposes), (5, 3))
+        for frame in xrange(61):
+            self.hud.draw(self.screen, 60.0)
+        self.assertEqual(self.hud.recomposes, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,7 @@
 
 import pygame, sys, time
 from pygame.locals import *
-from general import game_constants
+from general import game_constants, present, ScaledDisplay
 from scene import TitleScene
 
 if not pygame.font:
@@ -54,7 +54,7 @@ def game_loop(screen):
             last_frame_time = time.time()
 
             dirty_rects = scene.draw()
-            pygame.display.update(dirty_rects)
+            present(screen, dirty_rects)
 
         screen.set_clip()
 
@@ -63,13 +63,35 @@ def game_loop(screen):
             scene = new_scene
 
 def main(argv=sys.argv):
+    # --opengl draws through OpenGL (glrender.py) instead of blitting in software
+    opengl = '--opengl' in argv
+    argv = [arg for arg in argv if arg != '--opengl']
+
+    # --scale=N draws the game N times smaller than the window and blows it up (software only)
+    scale = 1
+    for arg in argv:
+        if arg.startswith('--scale='):
+            scale = max(1, int(arg[len('--scale='):]))
+    argv = [arg for arg in argv if not arg.startswith('--scale=')]
+
     if len(argv) == 2 and 640 <= int(argv[1]) <= 1280:
         game_constants.w, game_constants.h = (int(argv[1]), int(argv[1])*.75)
     else:
         game_constants.w, game_constants.h = (800,600)
 
     pygame.init()
-    screen = pygame.display.set_mode((game_constants.w, game_constants.h))
+    screen = None
+    if opengl:
+        import glrender
+        if glrender.gl is None:
+            print "Couldn't load PyOpenGL, drawing in software"
+        else:
+            screen = glrender.GLCanvas((int(game_constants.w), int(game_constants.h)))
+    if screen is None:
+        screen = pygame.display.set_mode((game_constants.w, game_constants.h))
+        if scale > 1:
+            screen = ScaledDisplay(screen, scale)
+            game_constants.w, game_constants.h = screen.get_size()
     pygame.display.set_caption('Typer Combat')
     pygame.mouse.set_visible(0)
     pygame.event.set_blocked(MOUSEMOTION)